@@ -26,6 +26,24 @@ from atlas.tasks.data_model.factory import create_dataset
 from datasets import Dataset, IterableDataset
 
 
+# Options that configure how a dataset is read rather than how it is written.
+DATASET_OPTIONS = (
+    "io_workers",
+    "stream_annotations",
+    "mask_workers",
+    "mask_format",
+    "size_cache",
+    "splits",
+    "image_format",
+    "image_quality",
+    "encode_workers",
+    "block_size",
+    "column_types",
+    "columns",
+    "filters",
+)
+
+
 class LanceDataSink:
     def __init__(self, path: str, mode: str = "overwrite", **kwargs):
         self.path = path
@@ -92,6 +110,11 @@ def sink(
         mode (str, optional): The write mode for the Lance dataset.
             Defaults to "overwrite".
         **kwargs: Additional options passed to the underlying data loader.
+            Options that are not listed below are passed on to
+            `BaseDataset.to_lance`, e.g. `num_workers` to read and write the
+            partitions of a dataset (currently COCO detection and
+            segmentation, and multi-file Parquet datasets) in parallel
+            worker processes.
 
     Keyword Args:
         expand_level (int): For Hugging Face datasets with nested schemas,
@@ -109,6 +132,67 @@ def sink(
               represented as true `None` (null) values. This is slightly
               slower but ensures that missing data is not misrepresented,
               leading to more accurate analysis.
+        io_workers (int): For image datasets (e.g. COCO, YOLO), the number of
+            threads used to read image files (and, for YOLO, to scan the image
+            directories and read the label files). The files of the next batch are read
+            while the current batch is being written. If not provided, a
+            default based on the CPU count is used. Set to 0 to read files
+            serially.
+        stream_annotations (bool): For COCO datasets, parse the annotation file
+            incrementally instead of loading the whole JSON document. Use this
+            for annotation files that are too large to fit in memory.
+            Defaults to False.
+        mask_workers (int): For COCO segmentation datasets, the number of
+            processes used to rasterize and encode instance masks. Defaults
+            to 0, which encodes masks serially in the calling process.
+        mask_format (str): For COCO segmentation datasets, how instance masks
+            are stored in the `mask` column.
+            - "png" (Default): One full-frame PNG per instance.
+            - "rle": Uncompressed COCO RLE counts (column-major run lengths,
+              starting with zeros) stored as a list of int32. Much smaller
+              and faster to write for dense-instance datasets. Use
+              `atlas.tasks.segmentation.masks.decode_mask` to decode.
+            - "polygon": No rasterization. Each instance stores its raw
+              polygons as list<list<float32>> and, for RLE annotations, the
+              compressed COCO RLE counts. For consumers that rasterize masks
+              themselves, e.g. at the augmented resolution.
+        splits (list): For YOLO datasets, the splits of `data.yaml` to read
+            (e.g. `["train", "val"]`). Each split is given in `data.yaml` as a
+            directory, a text file listing image paths, or a list of those,
+            and each row records its split in a `split` column. Defaults to
+            all of `train`, `val` and `test` that are defined. Images listed
+            by several splits are read once, for the first split. Datasets
+            without splits are read from `images/train2017`.
+        size_cache (str): For YOLO datasets, the path of a JSON file that
+            caches image dimensions by file path and modification time. Image
+            dimensions are otherwise parsed from the image headers on every
+            ingest.
+        image_format (str): For Hugging Face datasets, the codec used for
+            images that are only available as decoded PIL images: "png"
+            (Default, lossless), "jpeg" or "webp". Images that have their
+            original encoded bytes or file are always stored as-is.
+        image_quality (int): The quality (1-100) of the "jpeg" and "webp"
+            codecs. Defaults to the PIL default.
+        encode_workers (int): For Hugging Face datasets, the number of threads
+            used to encode PIL images. If not provided, a default based on the
+            CPU count is used. Set to 0 to encode serially.
+        blob_images (bool): For image datasets (COCO, YOLO, vision-language
+            and Hugging Face image features), write the image column with Lance
+            blob encoding. Images are stored out of line, so scans that only
+            read labels or boxes do not page in image data. Read the images
+            back with `atlas.utils.image.take_images`. Defaults to False.
+        block_size (int): For CSV files, the number of bytes parsed per block
+            by the streaming Arrow CSV reader. Column types are inferred from
+            the first block. If not provided, the Arrow default is used.
+        column_types (dict): For CSV files, a mapping from column name to Arrow
+            data type that overrides type inference, e.g.
+            `{"id": pa.int64(), "zip": pa.string()}`.
+        columns (list): For Parquet datasets, the columns to read. Only these
+            columns are decoded from the files. Defaults to all columns.
+        filters: For Parquet datasets, a row filter pushed down into the
+            Parquet reader, so that row groups that cannot match are skipped.
+            Either a `pyarrow.dataset` expression or filters in the DNF format
+            of `pyarrow.parquet.read_table`, e.g. `[("year", ">=", 2020)]`.
     """
     if not uri:
         raise ValueError("URI must be specified for the sink operation.")
@@ -118,6 +202,9 @@ def sink(
         "expand_level": kwargs.pop("expand_level", 0),
         "handle_nested_nulls": kwargs.pop("handle_nested_nulls", False),
     }
+    for option in DATASET_OPTIONS:
+        if option in kwargs:
+            dataset_kwargs[option] = kwargs.pop(option)
     # Pass the remaining kwargs to the LanceDataSink
     sink = LanceDataSink(path=uri, mode=mode, **kwargs)
     sink.write(data, task=task, format=format, **dataset_kwargs)
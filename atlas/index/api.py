@@ -1,4 +1,5 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+import itertools
 import json
 import io
 
@@ -9,9 +10,21 @@ from rich.table import Table
 from rich.console import Console
 from PIL import Image
 
+from .vectorizer.cache import EmbeddingCache
 from .vectorizer.vectorizer import Vectorizer
 
 
+# The number of rows read from the table at a time when vectorizing a text
+# column. The Vectorizer splits them into model batches by length, so this is
+# larger than the model batch size to give it texts of similar length to group.
+SCAN_BATCH_SIZE = 4096
+
+# The field metadata of a vector column created by the Indexer: the column the
+# vectors were embedded from, and the model that embedded them.
+VECTOR_SOURCE_KEY = "atlas:source_column"
+VECTOR_MODEL_KEY = "atlas:model"
+
+
 class Indexer:
     """
     A class to manage the indexing of data in a LanceDB table.
@@ -60,10 +73,14 @@ class Indexer:
         model: Optional[Any] = None,
         vector_column_name: str = "vector",
         batch_size: int = 32,
+        max_tokens: Optional[int] = None,
+        cache_uri: Optional[str] = None,
+        incremental: bool = False,
         **kwargs,
     ):
         """
         Creates an index on a specified column.
+
         Args:
             column (str): The name of the column to index.
             index_type (str): The type of index to create ('vector' or 'fts').
@@ -71,7 +88,24 @@ class Indexer:
                                    If not provided, a default model will be used
                                    based on the column's data type.
             vector_column_name (str): The name of the column to store the vectors in.
-            batch_size (int): The batch size for vectorization.
+            batch_size (int): The maximum number of inputs per model call.
+            max_tokens (Optional[int]): For text columns, the maximum number of
+                tokens (including padding) per model call. Texts are grouped by
+                length, so long texts are batched together and short texts are
+                not padded to their length.
+            cache_uri (Optional[str]): The URI of a local Lance dataset that
+                caches embeddings by model name and content hash. Values that
+                were embedded by the same model before (e.g. before an append
+                or a re-sink) are read from the cache instead of being embedded
+                again. Defaults to None (no cache).
+            incremental (bool): If True and `vector_column_name` was created by
+                an earlier call for the same column and model (e.g. before new
+                data was appended with `sink(..., mode="append")`), only the
+                rows without a vector (other than rows with a null value) are
+                embedded, and they are added to the existing vector index
+                (which is rebuilt if `**kwargs` are given). If there are no
+                such rows, the table is left unchanged. Otherwise the vector
+                column is rebuilt from scratch. Defaults to False.
             **kwargs: Additional keyword arguments for index creation.
         """
         if index_type == "vector":
@@ -90,44 +124,61 @@ class Indexer:
             # If not a pre-computed vector, vectorize the source column
             modality = self._get_modality(column)
             vectorizer = Vectorizer(model_name=model, modality=modality)
+            cache = None
+            if cache_uri is not None:
+                cache = EmbeddingCache(cache_uri, vectorizer.model_name)
 
-            # TODO: Implement an auto-batcher to dynamically determine the batch size
-            temp_table_name = f"{self.table.name}_temp_embeddings"
-            if temp_table_name in self.db.table_names():
-                self.db.drop_table(temp_table_name)
-
-            scanner = self.table.to_lance().scanner(
-                with_row_id=True, batch_size=batch_size
-            )
+            scan_batch_size = batch_size
+            if modality == "text":
+                scan_batch_size = max(batch_size, SCAN_BATCH_SIZE)
 
-            first_batch = True
-            for batch in scanner.to_batches():
-                column_data = batch.column(column).to_pylist()
-                embeddings = vectorizer.vectorize(column_data, batch_size=batch_size)
-
-                embedding_table = pa.Table.from_pydict(
-                    {
-                        "_rowid": batch.column("_rowid"),
-                        vector_column_name: embeddings,
-                    }
+            def embed(values: pa.Array) -> pa.FixedSizeListArray:
+                return vectorizer.vectorize(
+                    values, batch_size=batch_size, max_tokens=max_tokens, cache=cache
                 )
 
-                if first_batch:
-                    self.db.create_table(temp_table_name, embedding_table)
-                    first_batch = False
-                else:
-                    temp_table = self.db.open_table(temp_table_name)
-                    temp_table.add(embedding_table)
+            # The vectors record where they came from, so that an existing
+            # vector column is only extended with embeddings of the same kind.
+            vector_metadata = {
+                VECTOR_SOURCE_KEY: column,
+                VECTOR_MODEL_KEY: vectorizer.model_name,
+            }
+            if vector_column_name in self.table.schema.names:
+                field = self.table.to_lance().schema.field(vector_column_name)
+                field_metadata = {
+                    key.decode(): value.decode() for key, value in (field.metadata or {}).items()
+                }
+                if VECTOR_MODEL_KEY not in field_metadata:
+                    raise ValueError(
+                        f"Column '{vector_column_name}' already exists and does not hold "
+                        "vectors created by the Indexer. Choose another vector_column_name."
+                    )
+                if incremental and all(
+                    field_metadata.get(key) == value for key, value in vector_metadata.items()
+                ):
+                    try:
+                        self._extend_vectors(
+                            column, vector_column_name, embed, scan_batch_size, kwargs
+                        )
+                    finally:
+                        if cache is not None:
+                            cache.flush()
+                    return
+                print(f"Rebuilding the vectors in column '{vector_column_name}'...")
+                self.table.to_lance().drop_columns([vector_column_name])
+                self.table.checkout_latest()
 
-            if first_batch:
+            try:
+                has_rows = self._add_vectors(
+                    column, vector_column_name, embed, scan_batch_size, vector_metadata
+                )
+            finally:
+                if cache is not None:
+                    cache.flush()
+            if not has_rows:
                 print("No data to index.")
                 return
 
-            temp_table = self.db.open_table(temp_table_name)
-            self.table.merge(temp_table, left_on="_rowid", right_on="_rowid")
-
-            self.db.drop_table(temp_table_name)
-
             print(f"Creating vector index on column '{vector_column_name}'...")
             self.table.create_index(
                 vector_column_name=vector_column_name,
@@ -139,6 +190,137 @@ class Indexer:
         else:
             raise ValueError("index_type must be either 'vector' or 'fts'")
 
+    def _extend_vectors(
+        self,
+        column: str,
+        vector_column_name: str,
+        embed: Callable[[pa.Array], pa.FixedSizeListArray],
+        scan_batch_size: int,
+        index_kwargs: Dict[str, Any],
+    ) -> None:
+        """
+        Embeds the rows that were added since the vector column was created,
+        and adds them to its vector index.
+        """
+        num_rows = self._update_vectors(column, vector_column_name, embed, scan_batch_size)
+        dataset = self.table.to_lance()
+        index_names = [
+            index.name
+            for index in dataset.describe_indices()
+            if index.field_names == [vector_column_name]
+        ]
+        if index_names and not num_rows:
+            print("No new rows to index.")
+            return
+        if index_names and not index_kwargs:
+            print(f"Adding {num_rows} rows to the vector index on column '{vector_column_name}'...")
+            dataset.optimize.optimize_indices(index_names=index_names)
+            return
+
+        print(f"Creating vector index on column '{vector_column_name}'...")
+        self.table.create_index(vector_column_name=vector_column_name, **index_kwargs)
+
+    def _add_vectors(
+        self,
+        column: str,
+        vector_column_name: str,
+        embed: Callable[[pa.Array], pa.FixedSizeListArray],
+        scan_batch_size: int,
+        vector_metadata: Dict[str, str],
+    ) -> bool:
+        """
+        Embeds every row of a column into a new vector column.
+
+        Returns:
+            bool: Whether the table has any rows.
+        """
+        dataset = self.table.to_lance()
+        batches = (
+            pa.RecordBatch.from_arrays(
+                [batch.column("_rowid"), embed(batch.column(column))],
+                names=["_rowid", vector_column_name],
+            )
+            for batch in dataset.scanner(
+                columns=[column], with_row_id=True, batch_size=scan_batch_size
+            ).to_batches()
+        )
+        first_batch = next(batches, None)
+        if first_batch is None:
+            return False
+
+        # The embeddings are streamed into the merge instead of being staged
+        # in a temporary table.
+        schema = first_batch.schema
+        schema = schema.set(1, schema.field(1).with_metadata(vector_metadata))
+        reader = pa.RecordBatchReader.from_batches(
+            schema,
+            (batch.cast(schema) for batch in itertools.chain([first_batch], batches)),
+        )
+        dataset.merge(reader, left_on="_rowid", right_on="_rowid")
+        self.table.checkout_latest()
+        return True
+
+    def _update_vectors(
+        self,
+        column: str,
+        vector_column_name: str,
+        embed: Callable[[pa.Array], pa.FixedSizeListArray],
+        scan_batch_size: int,
+    ) -> int:
+        """
+        Embeds the rows of a column whose vectors are missing, e.g. because
+        they were appended after the column was indexed.
+
+        Only the fragments with missing vectors are rewritten, and only their
+        vector column. All the updated fragments are committed together.
+
+        Returns:
+            int: The number of rows that were embedded.
+        """
+        dataset = self.table.to_lance()
+        vector_type = dataset.schema.field(vector_column_name).type
+        schema = pa.schema([
+            pa.field("_rowid", pa.uint64()),
+            pa.field(vector_column_name, vector_type),
+        ])
+
+        num_rows = 0
+        updated_fragments = []
+        fields_modified = set()
+        for fragment in dataset.get_fragments():
+            # Rows of fragments written without the vector column read as null.
+            # Null values are never embedded, so their vectors stay null.
+            batches = fragment.scanner(
+                columns=[column],
+                filter=f"`{vector_column_name}` IS NULL AND `{column}` IS NOT NULL",
+                with_row_id=True,
+                batch_size=scan_batch_size,
+            ).to_batches()
+            first_batch = next(batches, None)
+            if first_batch is None:
+                continue
+
+            def embedded(batches=itertools.chain([first_batch], batches)):
+                nonlocal num_rows
+                for batch in batches:
+                    vectors = embed(batch.column(column)).cast(vector_type)
+                    num_rows += batch.num_rows
+                    yield pa.RecordBatch.from_arrays([batch.column("_rowid"), vectors], schema=schema)
+
+            metadata, fields = fragment.update_columns(
+                pa.RecordBatchReader.from_batches(schema, embedded())
+            )
+            updated_fragments.append(metadata)
+            fields_modified.update(fields)
+
+        if updated_fragments:
+            operation = lance.LanceOperation.Update(
+                updated_fragments=updated_fragments, fields_modified=sorted(fields_modified)
+            )
+            lance.LanceDataset.commit(dataset.uri, operation, read_version=dataset.version)
+            self.table.checkout_latest()
+        return num_rows
+
     def list_indexes(self, column: Optional[str] = None):
         """
         Displays the table schema with existing index types for each column.
@@ -0,0 +1,116 @@
+import hashlib
+import os
+from typing import Any, Dict, List
+
+import lance
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def content_hash(value: Any) -> str:
+    """
+    Returns the hash of a text or of encoded bytes (e.g. an image).
+    """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.blake2b(value, digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent cache of embeddings, stored as a local Lance dataset.
+
+    Embeddings are keyed by the model name and the hash of the embedded
+    content, so a value is only embedded once per model, whichever table or
+    row it comes from. Both keys have a BTREE scalar index, so lookups do not
+    scan the whole cache.
+
+    New embeddings are buffered and written `write_batch_size` rows at a time,
+    so call `flush` once all the embeddings were added.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        model_name: str,
+        write_batch_size: int = 8192,
+        max_fragments: int = 32,
+    ):
+        """
+        Initializes the EmbeddingCache.
+
+        Args:
+            uri (str): The URI of the Lance dataset that stores the cache. It is
+                created on the first write.
+            model_name (str): The name of the model whose embeddings are cached.
+            write_batch_size (int): The number of buffered embeddings that
+                triggers a write to the dataset.
+            max_fragments (int): The number of fragments above which the
+                dataset is compacted after a write.
+        """
+        self.uri = uri
+        self.model_name = model_name
+        self.write_batch_size = write_batch_size
+        self.max_fragments = max_fragments
+        self._pending: Dict[str, np.ndarray] = {}
+
+    def get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Looks up the embeddings of the given content hashes.
+
+        Returns:
+            Dict[str, np.ndarray]: The cached embeddings by hash. Hashes that
+                are not in the cache are missing from the result.
+        """
+        embeddings = {key: self._pending[key] for key in keys if key in self._pending}
+        keys = list(set(keys).difference(embeddings))
+        if not keys or not os.path.exists(self.uri):
+            return embeddings
+        table = lance.dataset(self.uri).to_table(
+            columns=["hash", "vector"],
+            filter=(pc.field("model") == self.model_name) & pc.field("hash").isin(keys),
+        )
+        if table.num_rows == 0:
+            return embeddings
+        vectors = table.column("vector").combine_chunks()
+        vectors = vectors.values.to_numpy().reshape(len(vectors), -1)
+        embeddings.update(zip(table.column("hash").to_pylist(), vectors))
+        return embeddings
+
+    def put(self, keys: List[str], vectors: np.ndarray) -> None:
+        """
+        Adds the embeddings of the given content hashes to the cache.
+        """
+        self._pending.update(zip(keys, np.asarray(vectors, dtype=np.float32)))
+        if len(self._pending) >= self.write_batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered embeddings to the dataset.
+
+        The scalar indices are created on the first write and updated on the
+        following ones, and the dataset is compacted once it has more than
+        `max_fragments` fragments.
+        """
+        if not self._pending:
+            return
+        vectors = np.stack(list(self._pending.values()))
+        table = pa.table({
+            "model": pa.array([self.model_name] * len(vectors), type=pa.string()),
+            "hash": pa.array(list(self._pending), type=pa.string()),
+            "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), vectors.shape[1]),
+        })
+        self._pending = {}
+
+        if not os.path.exists(self.uri):
+            dataset = lance.write_dataset(table, self.uri, mode="create")
+            dataset.create_scalar_index("model", index_type="BTREE")
+            dataset.create_scalar_index("hash", index_type="BTREE")
+            return
+
+        dataset = lance.write_dataset(table, self.uri, mode="append")
+        if len(dataset.get_fragments()) > self.max_fragments:
+            dataset.optimize.compact_files()
+        dataset.optimize.optimize_indices()
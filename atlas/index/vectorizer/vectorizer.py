@@ -1,12 +1,18 @@
-from typing import Any, Dict, List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 
-from transformers import AutoProcessor, AutoModel
+from transformers import AutoProcessor, AutoModel, AutoTokenizer
 from tqdm.auto import tqdm
+import numpy as np
 import torch
 import pyarrow as pa
 from PIL import Image
 import io
 
+from atlas.index.vectorizer.cache import EmbeddingCache, content_hash
+from atlas.utils.image import prefetch_map
+from atlas.utils.system import prefetch
+
 
 DEFAULT_MODEL_MAP = {
     "text": "sentence-transformers/all-mpnet-base-v2",
@@ -14,12 +20,74 @@ DEFAULT_MODEL_MAP = {
 }
 
 
+def decode_image(data: bytes) -> Image.Image:
+    """
+    Decodes an encoded image to an RGB PIL image.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        return image.convert("RGB")
+
+
+def mean_pool(token_embeddings: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """
+    Averages the token embeddings of each sequence, ignoring padding tokens.
+    """
+    mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+    summed = (token_embeddings * mask).sum(dim=1)
+    return summed / mask.sum(dim=1).clamp(min=1e-9)
+
+
+def token_budget_batches(
+    lengths: List[int], batch_size: int, max_tokens: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Groups inputs of similar length into batches.
+
+    The inputs are sorted by their tokenized length, so that each batch only
+    pads to the length of similar inputs. A batch holds at most `batch_size`
+    inputs and, if `max_tokens` is given, at most `max_tokens` tokens after
+    padding (but always at least one input).
+
+    Returns:
+        List[np.ndarray]: The indices of the inputs of each batch.
+    """
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    batches = []
+    start = 0
+    for end in range(1, len(order) + 1):
+        size = end - start
+        # The last input of a batch is the longest, since the order is sorted.
+        padded = (size + 1) * lengths[order[end]] if end < len(order) else 0
+        if (
+            end == len(order)
+            or size == batch_size
+            or (max_tokens is not None and padded > max_tokens)
+        ):
+            batches.append(order[start:end])
+            start = end
+    return batches
+
+
 class Vectorizer:
     """A class to manage vectorization of data."""
 
-    def __init__(self, model_name: str = None, modality: str = "text"):
+    def __init__(
+        self,
+        model_name: str = None,
+        modality: str = "text",
+        decode_workers: Optional[int] = None,
+    ):
         """
         Initializes the Vectorizer.
+
+        Args:
+            model_name (str): The Hugging Face model to use. Defaults to the
+                default model of the modality.
+            modality (str): "text" or "image".
+            decode_workers (Optional[int]): For images, the number of threads
+                used to decode the images of the next batch while the model
+                runs on the current one. If not provided, a default based on
+                the CPU count is used. Set to 0 to decode serially.
         """
         if model_name is None:
             model_name = DEFAULT_MODEL_MAP.get(modality)
@@ -28,70 +96,153 @@ class Vectorizer:
 
         self.model_name = model_name
         self.modality = modality
+        self.decode_workers = decode_workers
         print(f"Initializing vectorizer with model: {self.model_name}")
 
         if self.modality == "image":
             self.processor = AutoProcessor.from_pretrained(self.model_name)
             self.model = AutoModel.from_pretrained(self.model_name)
         else:
-            from transformers import pipeline
-            self.pipeline = pipeline("feature-extraction", model=self.model_name)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = AutoModel.from_pretrained(self.model_name)
+        self.model.eval()
+
+    @property
+    def dimension(self) -> int:
+        """The size of the vectors of the model."""
+        if self.modality == "image":
+            return self.model.config.projection_dim
+        return self.model.config.hidden_size
 
     def vectorize_batch(
-        self, data: List[Any], batch_size: int = 32
-    ) -> List[List[float]]:
+        self, data: List[Any], batch_size: int = 32, max_tokens: Optional[int] = None
+    ) -> np.ndarray:
         """
         Vectorizes a batch of data.
+
+        Args:
+            data (List[Any]): The texts, or the encoded images, to vectorize.
+            batch_size (int): The maximum number of inputs per model call.
+            max_tokens (Optional[int]): For text, the maximum number of tokens
+                (including padding) per model call. Texts are batched by
+                length, so that short texts are not padded to the length of
+                long ones.
+
+        Returns:
+            np.ndarray: A contiguous float32 array of shape (len(data), dimension).
         """
-        embeddings = []
+        if not data:
+            return np.empty((0, 0), dtype=np.float32)
         with torch.no_grad():
-            for i in tqdm(range(0, len(data), batch_size), desc="Vectorizing data"):
-                batch = data[i : i + batch_size]
-                if self.modality == "image":
-                    batch = [Image.open(io.BytesIO(d)) for d in batch]
-                    inputs = self.processor(images=batch, return_tensors="pt")
-                    image_features = self.model.get_image_features(**inputs)
-                    embeddings.extend(image_features.cpu().numpy().tolist())
-                else:
-                    batch_embeddings = self.pipeline(batch)
-                    for emb in batch_embeddings:
-                        # The pipeline returns a list of token embeddings. We average them.
-                        # But first, we need to handle the nesting which can be [[...]]
-                        flat_emb = emb
-                        while isinstance(flat_emb, list) and len(flat_emb) == 1:
-                            flat_emb = flat_emb[0]
-                        
-                        # Now, flat_emb is a list of token embeddings. Average them.
-                        if isinstance(flat_emb[0], list):
-                            # It's a list of lists (tokens), so we average
-                            num_tokens = len(flat_emb)
-                            if num_tokens > 0:
-                                sum_vec = [sum(dim) for dim in zip(*flat_emb)]
-                                avg_vec = [s / num_tokens for s in sum_vec]
-                                embeddings.append(avg_vec)
-                        else:
-                            # It's already a sentence embedding
-                            embeddings.append(flat_emb)
+            if self.modality == "image":
+                return self._vectorize_images(data, batch_size)
+            return self._vectorize_texts(data, batch_size, max_tokens)
+
+    def _vectorize_images(self, data: List[bytes], batch_size: int) -> np.ndarray:
+        batches = [data[i : i + batch_size] for i in range(0, len(data), batch_size)]
+        executor = None
+        if self.decode_workers != 0:
+            executor = ThreadPoolExecutor(max_workers=self.decode_workers)
+        inputs = None
+        try:
+            # The images of the next batch are decoded on the pool and then
+            # preprocessed on a background thread, both while the model runs on
+            # the current batch.
+            decoded = prefetch_map(decode_image, batches, executor)
+            inputs = prefetch(
+                self.processor(images=images, return_tensors="pt") for images in decoded
+            )
+            embeddings = []
+            for batch_inputs in tqdm(inputs, total=len(batches), desc="Vectorizing data"):
+                image_features = self.model.get_image_features(**batch_inputs)
+                if not isinstance(image_features, torch.Tensor):
+                    # Recent transformers versions return the projected
+                    # embeddings as the pooled output of a model output.
+                    image_features = image_features.pooler_output
+                embeddings.append(image_features.float().cpu().numpy())
+        finally:
+            if inputs is not None:
+                inputs.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return np.ascontiguousarray(np.concatenate(embeddings), dtype=np.float32)
 
+    def _vectorize_texts(
+        self, data: List[str], batch_size: int, max_tokens: Optional[int]
+    ) -> np.ndarray:
+        encodings = self.tokenizer(data, truncation=True)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+        embeddings = None
+        for indices in tqdm(
+            token_budget_batches(lengths, batch_size, max_tokens), desc="Vectorizing data"
+        ):
+            inputs = self.tokenizer.pad(
+                {key: [values[i] for i in indices] for key, values in encodings.items()},
+                return_tensors="pt",
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            batch_embeddings = mean_pool(token_embeddings, inputs["attention_mask"])
+            if embeddings is None:
+                embeddings = np.empty((len(data), batch_embeddings.shape[1]), dtype=np.float32)
+            # Write the embeddings back in the original order of the inputs.
+            embeddings[indices] = batch_embeddings.float().cpu().numpy()
         return embeddings
 
+    def _vectorize_cached(
+        self,
+        data: List[Any],
+        batch_size: int,
+        max_tokens: Optional[int],
+        cache: EmbeddingCache,
+    ) -> np.ndarray:
+        keys = [content_hash(value) for value in data]
+        embeddings = cache.get(keys)
+        # Each missing value is embedded once, even if it occurs in several rows.
+        missing = {key: value for key, value in zip(keys, data) if key not in embeddings}
+        if missing:
+            vectors = self.vectorize_batch(list(missing.values()), batch_size, max_tokens)
+            cache.put(list(missing), vectors)
+            embeddings.update(zip(missing, vectors))
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([embeddings[key] for key in keys]).astype(np.float32, copy=False)
+
     def vectorize(
-        self, data: Union[List[Any], pa.Array, pa.ChunkedArray], batch_size: int = 32
+        self,
+        data: Union[List[Any], pa.Array, pa.ChunkedArray],
+        batch_size: int = 32,
+        max_tokens: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
     ) -> pa.FixedSizeListArray:
         """
         Vectorizes the given data and returns it as a pyarrow FixedSizeListArray.
+
+        See `vectorize_batch` for the arguments. If a `cache` is given, only
+        the values whose embeddings are not cached yet are run through the
+        model, and their embeddings are added to the cache. Null values are
+        not embedded, and their vectors are null.
         """
         if isinstance(data, (pa.Array, pa.ChunkedArray)):
             data = data.to_pylist()
 
-        embeddings = self.vectorize_batch(data, batch_size)
-        
-        if not embeddings:
-            return pa.array([], type=pa.list_(pa.float32()))
-
-        dimension = len(embeddings[0])
-        flat_embeddings = [item for sublist in embeddings for item in sublist]
-        
-        return pa.FixedSizeListArray.from_arrays(
-            pa.array(flat_embeddings, type=pa.float32()), dimension
-        )
\ No newline at end of file
+        valid = [value is not None for value in data]
+        values = [value for value in data if value is not None]
+        if not values:
+            # The vectors keep the type of the model even if all are null.
+            embeddings = np.empty((0, self.dimension), dtype=np.float32)
+        elif cache is None:
+            embeddings = self.vectorize_batch(values, batch_size, max_tokens)
+        else:
+            embeddings = self._vectorize_cached(values, batch_size, max_tokens, cache)
+
+        dimension = embeddings.shape[1]
+        mask = None
+        if len(values) < len(data):
+            # Null values get zero-filled vectors behind a null mask.
+            valid = np.array(valid)
+            padded = np.zeros((len(data), dimension), dtype=np.float32)
+            padded[valid] = embeddings
+            embeddings, mask = padded, pa.array(~valid)
+
+        # The embeddings buffer is wrapped by Arrow without copying.
+        return pa.FixedSizeListArray.from_arrays(pa.array(embeddings.reshape(-1)), dimension, mask=mask)
@@ -15,12 +15,26 @@
 # limitations under the License.
 
 import json
+import multiprocessing
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, Generator, List, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    SupportsIndex,
+    Tuple,
+)
 
 import lance
 import pyarrow as pa
+from lance.fragment import FragmentMetadata, write_fragments
 
 
 @dataclass
@@ -34,6 +48,136 @@ class TaskMetadata:
     misc: Dict[str, Any] = field(default_factory=dict)
 
 
+# The number of rows of the first read from a dataset when batches are sized
+# to a byte budget. The following reads are sized by the measured row size.
+READ_BATCH_SIZE = 64
+
+
+def _open_batches(
+    read: Callable[[SupportsIndex], Iterable[pa.RecordBatch]],
+    batch_size: Optional[int],
+    batch_bytes: Optional[int],
+) -> Tuple[Optional[pa.RecordBatch], Iterator[pa.RecordBatch]]:
+    """
+    Opens a reader with `read(batch_size)`, peeks at its first batch and
+    returns it together with a stream of all the batches, including the first
+    one.
+
+    If `batch_size` is None, the reader is given an `AdaptiveBatcher` as its
+    batch size instead: the size of each read follows the measured size of the
+    rows so far, to fill `batch_bytes` (or a budget derived from the available
+    memory), and batches that are still larger are split as they stream
+    through.
+    """
+    from atlas.utils.system import AdaptiveBatcher, get_batch_byte_budget
+
+    batcher = None
+    if batch_size is None:
+        batcher = AdaptiveBatcher(
+            batch_bytes or get_batch_byte_budget(), batch_size=READ_BATCH_SIZE
+        )
+        batches = iter(read(batcher))
+    else:
+        batches = iter(read(batch_size))
+    first_batch = next(batches, None)
+
+    def stream():
+        try:
+            if first_batch is not None:
+                yield first_batch
+                yield from batches
+        finally:
+            # Ensure the generator is closed
+            if hasattr(batches, "close"):
+                batches.close()
+
+    if batcher is None:
+        return first_batch, stream()
+    return first_batch, batcher.rebatch(stream())
+
+
+def _encode_images(schema: pa.Schema, image_columns: List[str], blob_images: bool) -> pa.Schema:
+    """
+    Applies the image column policy to the schema that a dataset is written with.
+    """
+    from atlas.utils.image import image_field
+
+    if not blob_images:
+        return schema
+    fields = [
+        image_field(field.name, blob=True) if field.name in image_columns else field
+        for field in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _append_schema(schema: pa.Schema, uri: str, columns: List[str]) -> pa.Schema:
+    """
+    Returns the schema to append to an existing dataset with, in which the
+    given columns take the type of the dataset's columns. Datasets written
+    before image columns were unified store them as `binary`, and ClassLabel
+    columns as `string`, and appends would otherwise fail on the schema
+    mismatch.
+    """
+    existing = lance.dataset(uri).schema
+    fields = [
+        existing.field(field.name)
+        if field.name in columns and field.name in existing.names
+        else field
+        for field in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _write_partition(
+    dataset: "BaseDataset",
+    partition: Any,
+    uri: str,
+    batch_size: Optional[int],
+    batch_bytes: Optional[int],
+    blob_images: bool,
+    mode: str,
+    write_kwargs: Dict[str, Any],
+) -> Tuple[Optional[pa.Schema], "TaskMetadata", List[str]]:
+    """
+    Writes one partition of a dataset as uncommitted Lance fragments.
+
+    This is a module-level function so that it can be run in a process pool. The
+    fragments are returned as JSON so that the parent process can commit them.
+    """
+    first_batch, batches = _open_batches(
+        lambda size: dataset.partition_to_batches(partition, batch_size=size),
+        batch_size,
+        batch_bytes,
+    )
+    if first_batch is None:
+        return None, dataset.metadata, []
+
+    schema = _encode_images(first_batch.schema, dataset.image_columns, blob_images)
+    if mode == "append" and _dataset_exists(uri):
+        schema = _append_schema(
+            schema, uri, dataset.image_columns + dataset.class_label_columns
+        )
+        batches = (batch.cast(schema) for batch in batches)
+    fragments = write_fragments(
+        pa.RecordBatchReader.from_batches(schema, batches),
+        uri,
+        schema=schema,
+        mode="append" if mode == "append" else "overwrite",
+        **write_kwargs,
+    )
+    fragments = [json.dumps(fragment.to_json()) for fragment in fragments]
+    return schema, dataset.metadata, fragments
+
+
+def _dataset_exists(uri: str) -> bool:
+    try:
+        lance.dataset(uri)
+    except ValueError:
+        return False
+    return True
+
+
 class BaseDataset(ABC):
     """
     Abstract base class for all datasets in Atlas.
@@ -44,6 +188,12 @@ class BaseDataset(ABC):
     yielding batches of data as Arrow `RecordBatch` objects.
     """
 
+    # Columns that hold encoded images, written according to `blob_images`.
+    image_columns: List[str] = []
+    # Columns that hold label names as dictionaries, which appends cast to the
+    # type of an existing dataset's column.
+    class_label_columns: List[str] = []
+
     def __init__(self, data: str):
         self.data = data
         self.metadata = TaskMetadata()
@@ -53,6 +203,9 @@ class BaseDataset(ABC):
         uri: str,
         mode: str = "create",
         batch_size: Optional[int] = None,
+        num_workers: Optional[int] = None,
+        batch_bytes: Optional[int] = None,
+        blob_images: bool = False,
         **kwargs: Optional[Dict[str, Any]],
     ) -> None:
         """
@@ -67,46 +220,160 @@ class BaseDataset(ABC):
             mode (str, optional): The write mode. Can be "create", "append", or
                 "overwrite". Defaults to "create".
             batch_size (Optional[int], optional): The batch size to use when reading
-                the data. If not provided, a dynamic batch size will be calculated
-                based on the available system memory. Defaults to None.
+                the data. If not provided, reads are sized adaptively to a byte
+                budget instead (see `batch_bytes`). Defaults to None.
+            num_workers (Optional[int], optional): If greater than 1 and the
+                dataset declares partitions, each partition is read and written
+                as Lance fragments by a separate worker process, and the
+                fragments are committed together in partition order. Otherwise
+                the dataset is written from a single reader. Defaults to None.
+            batch_bytes (Optional[int], optional): The maximum size of a batch
+                in bytes when `batch_size` is not provided. The number of rows
+                of each read follows a moving average of the row size measured
+                so far, and batches that are still larger are split. If not
+                provided, it is derived from the available system memory.
+                Defaults to None.
+            blob_images (bool, optional): Write the image columns with Lance blob
+                encoding. The images are stored out of line, so scans of the
+                other columns (labels, boxes, ...) never read image data. Blob
+                columns are read back with `LanceDataset.take_blobs`, or with
+                `atlas.utils.image.take_images`. Defaults to False.
         """
-        from atlas.utils.system import get_dynamic_batch_size
-
-        reader = self.to_batches(batch_size=1)  # read one row to estimate size
+        kwargs.pop("image_root", None)
+        if num_workers and num_workers > 1:
+            partitions = self.partitions(num_workers)
+            if partitions:
+                self._to_lance_parallel(
+                    uri,
+                    mode,
+                    batch_size,
+                    batch_bytes,
+                    blob_images,
+                    partitions,
+                    num_workers,
+                    kwargs,
+                )
+                return
 
-        batches = iter(reader)
-        try:
-            first_batch = next(batches)
-        except StopIteration:
+        # The source is opened once: the first batch provides the schema and is
+        # then written together with the rest of the same reader.
+        first_batch, batches = _open_batches(
+            lambda size: self.to_batches(batch_size=size), batch_size, batch_bytes
+        )
+        if first_batch is None:
             print("Warning: The dataset is empty. An empty Lance dataset will be created.")
             return
 
-        row_size_in_bytes = first_batch.nbytes
-
-        if batch_size is None:
-            batch_size = get_dynamic_batch_size(row_size_in_bytes)
-
-        reader = self.to_batches(batch_size=batch_size)
-
-        def new_reader():
-            try:
-                yield first_batch
-                for batch in batches:
-                    yield batch
-            finally:
-                # Ensure the generator is closed
-                if hasattr(reader, 'close'):
-                    reader.close()
-
-        schema = first_batch.schema
+        schema = _encode_images(first_batch.schema, self.image_columns, blob_images)
+        if mode == "append" and _dataset_exists(uri):
+            schema = _append_schema(
+                schema, uri, self.image_columns + self.class_label_columns
+            )
+            batches = (batch.cast(schema) for batch in batches)
         if self.metadata:
             schema = schema.with_metadata({
                 "metadata": json.dumps(self.metadata.__dict__),
                 "decode_meta": json.dumps(self.metadata.decode_meta)
                 })
 
-        kwargs.pop("image_root", None)
-        lance.write_dataset(new_reader(), uri, schema=schema, mode=mode, **kwargs)
+        lance.write_dataset(batches, uri, schema=schema, mode=mode, **kwargs)
+
+    def _to_lance_parallel(
+        self,
+        uri: str,
+        mode: str,
+        batch_size: Optional[int],
+        batch_bytes: Optional[int],
+        blob_images: bool,
+        partitions: List[Any],
+        num_workers: int,
+        write_kwargs: Dict[str, Any],
+    ) -> None:
+        """
+        Writes each partition as Lance fragments in a process pool and commits
+        all of them in a single transaction.
+        """
+        if mode == "create" and _dataset_exists(uri):
+            # Match `lance.write_dataset`, which refuses to create over an
+            # existing dataset.
+            raise OSError(f"Dataset already exists: {uri}")
+        if mode == "append" and not _dataset_exists(uri):
+            # Like `lance.write_dataset`, appending to a missing dataset
+            # creates it.
+            mode = "create"
+
+        # Lance is not fork-safe, so the workers are spawned.
+        with ProcessPoolExecutor(
+            max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _write_partition,
+                    self,
+                    partition,
+                    uri,
+                    batch_size,
+                    batch_bytes,
+                    blob_images,
+                    mode,
+                    write_kwargs,
+                )
+                for partition in partitions
+            ]
+            results = [future.result() for future in futures]
+
+        schema = None
+        fragments = []
+        for partition_schema, metadata, partition_fragments in results:
+            if partition_schema is None:
+                continue
+            if schema is None:
+                schema = partition_schema
+                self.metadata = metadata
+            fragments.extend(FragmentMetadata.from_json(f) for f in partition_fragments)
+
+        if schema is None:
+            print("Warning: The dataset is empty. An empty Lance dataset will be created.")
+            return
+
+        if mode == "append":
+            read_version = lance.dataset(uri).version
+            operation = lance.LanceOperation.Append(fragments)
+        else:
+            read_version = None
+            if self.metadata:
+                schema = schema.with_metadata({
+                    "metadata": json.dumps(self.metadata.__dict__),
+                    "decode_meta": json.dumps(self.metadata.decode_meta)
+                    })
+            operation = lance.LanceOperation.Overwrite(schema, fragments)
+        lance.LanceDataset.commit(uri, operation, read_version=read_version)
+
+    def partitions(self, num_partitions: int) -> Optional[List[Any]]:
+        """
+        Splits the dataset into independent partitions for parallel ingestion.
+
+        Datasets that can be read in independent pieces (files, line ranges,
+        image ranges, ...) override this together with `partition_to_batches`.
+        Partitions must be picklable, and their concatenation in list order must
+        be the same as `to_batches`.
+
+        Args:
+            num_partitions (int): The suggested number of partitions.
+
+        Returns:
+            Optional[List[Any]]: The partitions, or None if the dataset cannot
+                be partitioned.
+        """
+        return None
+
+    def partition_to_batches(
+        self, partition: Any, batch_size: int = 1024
+    ) -> Generator[pa.RecordBatch, None, None]:
+        """
+        Yields the batches of a single partition returned by `partitions`.
+        """
+        raise NotImplementedError
 
     @staticmethod
     def get_metadata(uri: str) -> TaskMetadata:
@@ -140,7 +407,11 @@ class BaseDataset(ABC):
 
         Args:
             batch_size (int, optional): The number of rows in each batch.
-                Defaults to 1024.
+                When the batches are sized to a byte budget, this is an
+                `AdaptiveBatcher`, whose size changes as rows are measured.
+                Readers that can should take it with `operator.index` before
+                each batch (e.g. with `atlas.utils.system.batch_ranges`), so
+                that the reads follow it. Defaults to 1024.
 
         Yields:
             Generator[pa.RecordBatch, None, None]: A generator of Arrow `RecordBatch`
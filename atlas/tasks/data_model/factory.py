@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import glob
 import os
 import json
 from typing import Any, Union, Optional, Tuple
@@ -46,10 +47,15 @@ def infer_dataset_type(data: str) -> Tuple[Optional[str], Optional[str]]:
             os.path.join(data, "labels")
         ):
             return "object_detection", "yolo"
+        elif next(glob.iglob(os.path.join(data, "**", "*.parquet"), recursive=True), None):
+            return "tabular", "parquet"
     elif data.endswith(".csv"):
         return "tabular", "csv"
     elif data.endswith(".parquet"):
         return "tabular", "parquet"
+    elif data.endswith((".yaml", ".yml")):
+        # A YOLO data.yaml
+        return "object_detection", "yolo"
     elif data.endswith(".json"):
         # A json file could be a COCO dataset
         return "object_detection", "coco"
@@ -145,11 +151,11 @@ def create_dataset(
         if format == "csv":
             from atlas.tasks.tabular.csv import CsvDataset
 
-            return CsvDataset(data)
+            return CsvDataset(data, **kwargs)
         elif format == "parquet":
             from atlas.tasks.tabular.parquet import ParquetDataset
 
-            return ParquetDataset(data)
+            return ParquetDataset(data, **kwargs)
     elif task == "text":
         if format == "text":
             from atlas.tasks.text.text import TextDataset
@@ -15,16 +15,104 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import io
-from typing import Generator, List, Dict, Any
+import operator
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, List, Dict, Any, Optional
 
 import pyarrow as pa
+import pyarrow.compute as pc
 from datasets import Dataset, IterableDataset
 from datasets.features.features import ClassLabel, Value, Sequence, Image, Audio, Features
+from datasets.utils.file_utils import xopen
 from PIL.Image import Image as PILImage
 
 from atlas.tasks.data_model.base import BaseDataset
-from atlas.utils.system import check_ffmpeg
+from atlas.utils.image import IMAGE_FORMATS, encode_image, image_field
+from atlas.utils.system import batch_ranges, check_ffmpeg, prefetch
+
+
+# ClassLabel columns are stored as their label indices with the label names as
+# the dictionary, and read back as strings.
+CLASS_LABEL_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def has_class_labels(arrow_type: pa.DataType) -> bool:
+    """
+    Returns whether a type holds ClassLabel values, at the top level or nested
+    in lists and structs.
+    """
+    if arrow_type == CLASS_LABEL_TYPE:
+        return True
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return has_class_labels(arrow_type.value_type)
+    if pa.types.is_struct(arrow_type):
+        return any(has_class_labels(field.type) for field in arrow_type)
+    return False
+
+
+def read_file(path: str) -> bytes:
+    """
+    Reads the bytes of the file of an Image or Audio feature.
+
+    Paths that are not local files, e.g. `hf://` paths or files inside an
+    archive (`zip://image.png::archive.zip`), are opened with the `datasets`
+    file system helpers, as when the feature is decoded.
+    """
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    with xopen(path, "rb") as f:
+        return f.read()
+
+
+def class_label_array(indices: pa.Array, feature: ClassLabel) -> pa.Array:
+    """
+    Converts the label indices of a ClassLabel column, or of a list of
+    ClassLabels, to a dictionary array of the label names.
+
+    Negative indices (Hugging Face uses -1 for unlabeled examples) become nulls.
+    """
+    if pa.types.is_list(indices.type) or pa.types.is_large_list(indices.type):
+        values = class_label_array(indices.values, feature)
+        return type(indices).from_arrays(indices.offsets, values, mask=indices.is_null())
+    indices = pc.if_else(pc.less(indices, 0), None, indices).cast(pa.int32())
+    return pa.DictionaryArray.from_arrays(indices, pa.array(feature.names, type=pa.string()))
+
+
+def expand_column(array: pa.Array, steps: tuple) -> pa.Array:
+    """
+    Extracts an expanded column from the Arrow array of its source column.
+
+    Each step is a `(field name, over_list)` pair. A struct step takes the
+    field of the struct, and a list step takes the field of every struct in a
+    list of structs, keeping the list offsets. Nulls of the parents are
+    propagated to the result.
+    """
+    for sub_name, over_list in steps:
+        if over_list:
+            # `flatten` and the rebased offsets account for sliced arrays.
+            offsets = pc.subtract(array.offsets, array.offsets[0])
+            values = pc.struct_field(array.flatten(), sub_name)
+            mask = array.is_null() if array.null_count else None
+            array = type(array).from_arrays(offsets, values, mask=mask)
+        else:
+            array = pc.struct_field(array, sub_name)
+    return array
+
+
+def _is_arrow_native(feature: Any) -> bool:
+    """
+    Checks whether a feature is stored by Hugging Face in the same form as it
+    is written to Lance, so that its Arrow data can be used as-is.
+    """
+    if isinstance(feature, Value):
+        return feature.dtype != "object"
+    if isinstance(feature, Sequence):
+        return _is_arrow_native(feature.feature)
+    if isinstance(feature, dict):
+        return all(_is_arrow_native(sub_feature) for sub_feature in feature.values())
+    return False
 
 
 class HFDataset(BaseDataset):
@@ -37,6 +125,20 @@ class HFDataset(BaseDataset):
         self.expand_level = expand_level
         self._expansion_map = {}
         self.metadata.decode_meta = self._get_decode_meta()
+        self.image_format = kwargs.get("image_format", "png")
+        if self.image_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unsupported image format: {self.image_format}. Expected one of {IMAGE_FORMATS}."
+            )
+        self.image_quality = kwargs.get("image_quality")
+        self.encode_workers = kwargs.get("encode_workers")
+        self._encode_executor = None
+        self.image_columns = [
+            name for name, feature in self.data.features.items() if isinstance(feature, Image)
+        ]
+        self.class_label_columns = [
+            field.name for field in self.to_arrow_schema() if has_class_labels(field.type)
+        ]
         if any(isinstance(f, Audio) for f in self.data.features.values()):
             try:
                 check_ffmpeg()
@@ -57,21 +159,27 @@ class HFDataset(BaseDataset):
             fields.extend(self._feature_to_fields(name, feature, self.expand_level))
         return pa.schema(fields)
 
-    def _feature_to_fields(self, name: str, feature: Any, expand_level: int) -> List[pa.Field]:
+    def _feature_to_fields(
+        self, name: str, feature: Any, expand_level: int, plan: Optional[tuple] = None
+    ) -> List[pa.Field]:
+        # The plan of an expanded column is compiled here, once per schema: the
+        # source column and the steps that extract the column from it.
+        source, steps = plan or (name, ())
         if expand_level > 0 and isinstance(feature, dict):
             fields = []
             for sub_name, sub_feature in sorted(feature.items()):
                 new_name = f"{name}_{sub_name}"
-                self._expansion_map[new_name] = (name, sub_name, "dict")
-                fields.extend(self._feature_to_fields(new_name, sub_feature, expand_level - 1))
+                sub_plan = (source, steps + ((sub_name, False),))
+                self._expansion_map[new_name] = sub_plan + (sub_feature,)
+                fields.extend(self._feature_to_fields(new_name, sub_feature, expand_level - 1, sub_plan))
             return fields
 
         if expand_level > 0 and isinstance(feature, Sequence) and isinstance(feature.feature, dict):
             fields = []
             for sub_name, sub_feature in sorted(feature.feature.items()):
                 new_name = f"{name}_{sub_name}"
-                self._expansion_map[new_name] = (name, sub_name, "list_of_dicts")
                 list_of_sub_feature = Sequence(feature=sub_feature)
+                self._expansion_map[new_name] = (source, steps + ((sub_name, True),), list_of_sub_feature)
                 fields.append(self._feature_to_field(new_name, list_of_sub_feature))
             return fields
 
@@ -79,11 +187,11 @@ class HFDataset(BaseDataset):
 
     def _feature_to_field(self, name: str, feature: Any) -> pa.Field:
         if isinstance(feature, Image):
-            return pa.field(name, pa.large_binary(), metadata={"lance:encoding": "binary"})
+            return image_field(name)
         if isinstance(feature, Audio):
             return pa.field(name, pa.large_binary(), metadata={"lance:encoding": "binary"})
         if isinstance(feature, ClassLabel):
-            return pa.field(name, pa.string())
+            return pa.field(name, CLASS_LABEL_TYPE)
         if isinstance(feature, Value):
             # Handle cases where the dtype is 'object' which might be an image
             if feature.dtype == 'object':
@@ -103,6 +211,31 @@ class HFDataset(BaseDataset):
 
         raise TypeError(f"Unsupported feature type for column '{name}': {type(feature)}")
 
+    def _encode_images(self, images: List[Any]) -> List[Any]:
+        """
+        Encodes the decoded PIL images of a column with the configured codec,
+        on a thread pool unless `encode_workers` is 0. Other values are kept.
+        """
+        positions = [i for i, img in enumerate(images) if isinstance(img, PILImage)]
+        if not positions:
+            return images
+
+        def encode(img: PILImage) -> bytes:
+            return encode_image(img, self.image_format, self.image_quality)
+
+        pil_images = [images[i] for i in positions]
+        if self.encode_workers == 0:
+            encoded = map(encode, pil_images)
+        else:
+            if self._encode_executor is None:
+                # PIL releases the GIL while encoding, so threads run in parallel.
+                self._encode_executor = ThreadPoolExecutor(max_workers=self.encode_workers)
+            encoded = self._encode_executor.map(encode, pil_images)
+        images = list(images)
+        for i, data in zip(positions, encoded):
+            images[i] = data
+        return images
+
     def _process_column(self, column_data: list, feature: Any, arrow_type: pa.DataType = None) -> pa.Array:
         # PIL Image handling
         is_pil_column = False
@@ -117,41 +250,36 @@ class HFDataset(BaseDataset):
             serialized = []
             for img in column_data:
                 if isinstance(img, PILImage):
-                    buf = io.BytesIO()
-                    img.save(buf, format='PNG')
-                    serialized.append(buf.getvalue())
+                    serialized.append(img)  # encoded below
                 elif isinstance(img, dict) and 'bytes' in img and img['bytes']:
                     serialized.append(img['bytes'])
                 elif isinstance(img, dict) and 'path' in img and img['path']:
-                    with open(img['path'], 'rb') as f:
-                        serialized.append(f.read())
+                    serialized.append(read_file(img['path']))
                 else:
                     serialized.append(None)
-            return pa.array(serialized, type=pa.large_binary())
+            return pa.array(self._encode_images(serialized), type=pa.large_binary())
 
         if isinstance(feature, Audio):
             serialized = []
             for aud in column_data:
                 if isinstance(aud, dict):
                     if aud.get('path'):
-                        with open(aud['path'], 'rb') as f:
-                            serialized.append(f.read())
+                        serialized.append(read_file(aud['path']))
                     elif aud.get('bytes'):
                         serialized.append(aud['bytes'])
                     else:
                         serialized.append(None)
                 elif hasattr(aud, 'path'): # Handle AudioDecoder object
-                    with open(aud.path, 'rb') as f:
-                        serialized.append(f.read())
+                    serialized.append(read_file(aud.path))
                 else:
                     serialized.append(None)
             return pa.array(serialized, type=pa.large_binary())
 
         if isinstance(feature, ClassLabel):
-            return pa.array([feature.int2str(val) if val is not None else None for val in column_data], type=pa.string())
+            return class_label_array(pa.array(column_data, type=pa.int64()), feature)
 
         if isinstance(feature, Sequence) and isinstance(feature.feature, ClassLabel):
-            return pa.array([[feature.feature.int2str(v) for v in val_list] if val_list is not None else None for val_list in column_data], type=arrow_type)
+            return class_label_array(pa.array(column_data, type=pa.list_(pa.int64())), feature.feature)
 
         if pa.types.is_struct(arrow_type):
             cleaned_data = []
@@ -182,97 +310,66 @@ class HFDataset(BaseDataset):
 
     def to_batches(self, batch_size: int = 1024, **kwargs) -> Generator[pa.RecordBatch, None, None]:
         schema = self.to_arrow_schema()
-        
-        # To prevent the torchcodec error, we must remove the Audio feature type
-        # before any iteration or slicing.
         original_features = self.data.features
-        new_features = original_features.copy()
-        has_audio = False
-        for col_name, feature in new_features.items():
-            if isinstance(feature, Audio):
-                has_audio = True
-                # Cast to a raw type to prevent the decoder from running.
-                new_features[col_name] = Audio(decode=False)
-
-        if has_audio:
-            sanitized_data = self.data.cast(new_features)
+        # Hugging Face datasets are Arrow-backed: read the Arrow tables directly
+        # instead of converting every batch to Python objects. The Arrow format
+        # also leaves images and audio undecoded.
+        arrow_data = self.data.with_format("arrow")
+        if isinstance(self.data, IterableDataset):
+            # Streaming datasets are read on a background thread, so that
+            # fetching the next batch overlaps with writing the current one.
+            # Their batch size is fixed when the stream is opened.
+            tables = prefetch(arrow_data.iter(batch_size=operator.index(batch_size)))
         else:
-            sanitized_data = self.data
-
-        if isinstance(sanitized_data, IterableDataset):
-            # For IterableDataset, we manually create batches as lists of dicts
-            batch_as_list_of_dicts = []
-            for item in sanitized_data:
-                batch_as_list_of_dicts.append(item)
-                if len(batch_as_list_of_dicts) == batch_size:
-                    # Convert the list of dicts to a dict of lists before processing
-                    batch_as_dict_of_lists = {
-                        key: [d.get(key) for d in batch_as_list_of_dicts]
-                        for key in (batch_as_list_of_dicts[0] if batch_as_list_of_dicts else {})
-                    }
-                    yield self._process_batch(batch_as_dict_of_lists, schema, original_features)
-                    batch_as_list_of_dicts = []
-            if batch_as_list_of_dicts:
-                batch_as_dict_of_lists = {
-                    key: [d.get(key) for d in batch_as_list_of_dicts]
-                    for key in (batch_as_list_of_dicts[0] if batch_as_list_of_dicts else {})
-                }
-                yield self._process_batch(batch_as_dict_of_lists, schema, original_features)
-        else:
-            # For regular Dataset, slicing gives us a dict of lists directly
-            for i in range(0, len(sanitized_data), batch_size):
-                batch_as_dict_of_lists = sanitized_data[i : i + batch_size]
-                yield self._process_batch(batch_as_dict_of_lists, schema, original_features)
+            tables = (
+                arrow_data[rows.start : rows.stop]
+                for rows in batch_ranges(len(arrow_data), batch_size)
+            )
+        for table in tables:
+            yield self._process_table(table, schema, original_features)
+
+    def _process_table(self, table: pa.Table, schema: pa.Schema, features: Features) -> pa.RecordBatch:
+        """
+        Converts a slice of the Arrow table of a Hugging Face dataset to a batch.
 
-    def _process_batch(self, batch: Dict[str, list], schema: pa.Schema, features: Features) -> pa.RecordBatch:
+        Columns whose features are plain values, lists and structs are taken
+        from the table without copying (cast to the target type if needed), and
+        class labels are dictionary-encoded from their indices. Expanded columns
+        are extracted from their source column with Arrow struct field and list
+        kernels first. Only the remaining columns (images, audio, ...) go
+        through Python objects.
+        """
         arrays = []
         for field in schema:
             if field.name in self._expansion_map:
-                original_name, sub_name, expansion_type = self._expansion_map[
-                    field.name
-                ]
-                original_feature = features[original_name]
-
-                if expansion_type == "dict":
-                    sub_feature = original_feature[sub_name]
-                    column_data = [
-                        row.get(sub_name) if row else None
-                        for row in batch[original_name]
-                    ]
-                    processed_data = self._process_column(
-                        column_data, sub_feature, field.type
-                    )
-                    arrays.append(processed_data)
-
-                elif expansion_type == "list_of_dicts":
-                    sub_feature = original_feature.feature[sub_name]
-                    sub_lists = []
-                    for list_of_dicts in batch[original_name]:
-                        if list_of_dicts is None:
-                            sub_lists.append(None)
-                        else:
-                            sub_lists.append(
-                                [
-                                    d.get(sub_name) if isinstance(d, dict) else None
-                                    for d in list_of_dicts
-                                ]
-                            )
-
-                    processed_data = self._process_column(
-                        sub_lists, Sequence(feature=sub_feature), field.type
-                    )
-                    arrays.append(processed_data)
-
+                source, steps, feature = self._expansion_map[field.name]
+                column = pa.chunked_array([expand_column(table.column(source).combine_chunks(), steps)])
             else:
-                column_data = batch[field.name]
-                feature = features[field.name]
-                processed_data = self._process_column(
-                    column_data, feature, field.type
-                )
-                arrays.append(processed_data)
+                column, feature = table.column(field.name), features[field.name]
+            array = self._arrow_column(column, feature, field.type)
+            if array is None:
+                array = self._process_column(column.to_pylist(), feature, field.type)
+            arrays.append(array)
 
         return pa.RecordBatch.from_arrays(arrays, schema=schema)
 
+    @staticmethod
+    def _arrow_column(column: pa.ChunkedArray, feature: Any, arrow_type: pa.DataType) -> Optional[pa.Array]:
+        """
+        Converts a column of the Arrow table of a Hugging Face dataset without
+        going through Python objects, or returns None if it cannot be.
+        """
+        if isinstance(feature, ClassLabel):
+            return class_label_array(column.combine_chunks(), feature)
+        if isinstance(feature, Sequence) and isinstance(feature.feature, ClassLabel):
+            return class_label_array(column.combine_chunks(), feature.feature)
+        if _is_arrow_native(feature):
+            try:
+                return column.combine_chunks().cast(arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                pass
+        return None
+
     @property
     def schema(self) -> pa.Schema:
         return self.to_arrow_schema()
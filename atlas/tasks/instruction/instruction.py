@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import json
+import operator
 from typing import Generator
 
 import pyarrow as pa
@@ -46,7 +47,7 @@ class InstructionDataset(BaseDataset):
                 for line in f:
                     record = json.loads(line)
                     process_record(record)
-                    if len(instructions) == batch_size:
+                    if len(instructions) >= operator.index(batch_size):
                         yield pa.RecordBatch.from_arrays(
                             [
                                 pa.array(instructions, type=pa.string()),
@@ -60,7 +61,7 @@ class InstructionDataset(BaseDataset):
         else:
             for record in self.data:
                 process_record(record)
-                if len(instructions) == batch_size:
+                if len(instructions) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [
                             pa.array(instructions, type=pa.string()),
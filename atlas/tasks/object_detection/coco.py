@@ -14,13 +14,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+import itertools
 import os
-from typing import Generator
+from typing import Generator, List
 
 import pyarrow as pa
 
 from atlas.tasks.data_model.base import BaseDataset
+from atlas.utils.coco import CocoIndex
+from atlas.utils.image import image_field, prefetch_binary
 
 
 class CocoDataset(BaseDataset):
@@ -28,11 +30,15 @@ class CocoDataset(BaseDataset):
     A dataset that reads data from a COCO JSON file.
     """
 
+    image_columns = ["image"]
+
     def __init__(self, data: str, **kwargs):
         super().__init__(data)
         self.image_root = kwargs.get("image_root")
         if self.image_root is None:
             self.image_root = self._infer_image_root()
+        self.io_workers = kwargs.get("io_workers")
+        self.stream_annotations = kwargs.get("stream_annotations", False)
 
     def _infer_image_root(self) -> str:
         """
@@ -47,72 +53,80 @@ class CocoDataset(BaseDataset):
                 return image_dir
         return annotation_dir
 
+    def _image_path(self, file_name: str) -> str:
+        """
+        Resolves the path of an image from its COCO file name.
+        """
+        if self.image_root:
+            return os.path.join(self.image_root, file_name)
+        return file_name
+
     def to_batches(self, batch_size: int = 1024, **kwargs) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
-        with open(self.data, "r") as f:
-            coco_data = json.load(f)
+        return self.partition_to_batches(self._load_index(), batch_size=batch_size)
 
-        images = {image["id"]: image for image in coco_data["images"]}
-        annotations_by_image = {}
-        for ann in coco_data.get("annotations", []):
-            annotations_by_image.setdefault(ann["image_id"], []).append(ann)
+    def partitions(self, num_partitions: int) -> List[CocoIndex]:
+        """
+        Splits the images into `num_partitions` contiguous shards.
 
-        captions_by_image = {}
-        if "captions" in coco_data:
-            for cap in coco_data["captions"]:
-                captions_by_image.setdefault(cap["image_id"], []).append(cap["caption"])
+        The annotation file is parsed once, and each partition is a compact
+        index of only the images, annotations and captions of its shard.
+        """
+        return self._load_index().shards(num_partitions)
 
-        if "categories" in coco_data:
-            self.metadata.class_names = {cat["id"]: cat["name"] for cat in coco_data["categories"]}
+    def _load_index(self) -> CocoIndex:
+        index = CocoIndex.from_file(self.data, streaming=self.stream_annotations)
+        if index.categories:
+            self.metadata.class_names = index.class_names
+        return index
 
-        image_ids = list(images.keys())
+    def partition_to_batches(
+        self, partition: CocoIndex, batch_size: int = 1024
+    ) -> Generator[pa.RecordBatch, None, None]:
+        """
+        Yields the batches of the images of one partition index.
+        """
+        index = partition
+        if index.categories:
+            self.metadata.class_names = index.class_names
 
-        for i in range(0, len(image_ids), batch_size):
-            batch_image_ids = image_ids[i : i + batch_size]
+        # The batches are read by the prefetching image reader, one ahead.
+        batched_image_indices, batched_path_indices = itertools.tee(
+            index.image_batches(batch_size)
+        )
+        batched_image_paths = (
+            [self._image_path(index.file_names[k]) for k in batch_image_indices]
+            for batch_image_indices in batched_path_indices
+        )
+        batched_images = prefetch_binary(batched_image_paths, self.io_workers)
 
-            images_data = []
+        for batch_image_indices, images in zip(batched_image_indices, batched_images):
             all_bboxes = []
             all_labels = []
             all_keypoints = []
             all_captions = []
-            heights = []
-            widths = []
-            file_names = []
-
-            for image_id in batch_image_ids:
-                image_info = images[image_id]
-                image_path = (
-                    os.path.join(self.image_root, image_info["file_name"])
-                    if self.image_root
-                    else image_info["file_name"]
-                )
-                with open(image_path, "rb") as f:
-                    images_data.append(f.read())
-
-                annotations = annotations_by_image.get(image_id, [])
-                bboxes = [ann.get("bbox") for ann in annotations]
-                labels = [ann.get("category_id") for ann in annotations]
-                keypoints = [ann.get("keypoints") for ann in annotations]
-
-                all_bboxes.append(bboxes)
-                all_labels.append(labels)
-                all_keypoints.append(keypoints)
-                all_captions.append(captions_by_image.get(image_id, []))
-                heights.append(image_info.get("height", 0))
-                widths.append(image_info.get("width", 0))
-                file_names.append(image_info.get("file_name", ""))
+
+            for k in batch_image_indices:
+                annotations = index.annotations(k)
+                all_bboxes.append(index.bboxes(annotations))
+                all_labels.append(index.labels(annotations))
+                all_keypoints.append(index.keypoints_of(annotations))
+                all_captions.append(index.image_captions(k))
+
+            heights, widths = index.image_sizes(batch_image_indices)
+            file_names = index.file_names[batch_image_indices.start : batch_image_indices.stop]
 
             batch = pa.RecordBatch.from_arrays(
                 [
-                    pa.array(images_data, type=pa.binary()),
+                    images,
                     pa.array(all_bboxes, type=pa.list_(pa.list_(pa.float32()))),
                     pa.array(all_labels, type=pa.list_(pa.int64())),
                     pa.array(all_keypoints, type=pa.list_(pa.list_(pa.float32()))),
                     pa.array(all_captions, type=pa.list_(pa.string())),
-                    pa.array(heights, type=pa.int64()),
-                    pa.array(widths, type=pa.int64()),
+                    heights,
+                    widths,
                     pa.array(file_names, type=pa.string()),
                 ],
                 names=[
@@ -135,7 +149,7 @@ class CocoDataset(BaseDataset):
         """
         return pa.schema(
             [
-                pa.field("image", pa.binary()),
+                image_field("image"),
                 pa.field("bbox", pa.list_(pa.list_(pa.float32()))),
                 pa.field("label", pa.list_(pa.int64())),
                 pa.field("keypoints", pa.list_(pa.list_(pa.float32()))),
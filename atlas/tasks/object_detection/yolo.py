@@ -14,133 +14,291 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+import itertools
 import os
-from typing import Generator
-from PIL import Image
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Generator, List, Optional, Tuple
 import yaml
 
+import numpy as np
 import pyarrow as pa
 
 from atlas.tasks.data_model.base import BaseDataset
+from atlas.utils.arrow import concat_ranges, lengths_to_offsets
+from atlas.utils.image import ImageSizeCache, image_size, prefetch_binary, scan_files
+from atlas.utils.system import batch_ranges
+
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+
+SPLITS = ("train", "val", "test")
+
+
+def _read_label_file(label_path: str) -> Optional[np.ndarray]:
+    """
+    Parses a YOLO label file into an `(N, 5)` array, or returns None if the
+    image has no label file.
+    """
+    try:
+        with open(label_path, "r") as f:
+            rows = np.array(f.read().split(), dtype=np.float64)
+    except FileNotFoundError:
+        return None
+    if rows.size % 5:
+        raise ValueError(
+            f"Invalid YOLO label file {label_path}: expected 5 values per line "
+            "(class x_center y_center width height)."
+        )
+    return rows.reshape(-1, 5)
+
+
+def label_path(image_path: str) -> str:
+    """
+    Returns the label file of an image, following the YOLO convention of
+    replacing the last `images` directory of the path with `labels`.
+    """
+    parts = image_path.split(os.sep)
+    if "images" in parts:
+        i = len(parts) - 1 - parts[::-1].index("images")
+        parts[i] = "labels"
+    return os.path.splitext(os.sep.join(parts))[0] + ".txt"
 
 
 class YoloDataset(BaseDataset):
     """
-    A dataset that reads data from a YOLO detection file.
+    A dataset that reads data from a YOLO detection dataset.
+
+    If the `data.yaml` of the dataset declares splits (`train`, `val`, `test`),
+    the images of every split are read, and each row records its split in a
+    `split` column. An image listed by several splits (e.g. a `val` that points
+    at the `train` images) is read once, for the first of them. Otherwise the
+    images are read from `images/train2017`.
     """
 
+    image_columns = ["image"]
+
     def __init__(self, data: str, **kwargs):
         super().__init__(data)
+        size_cache = kwargs.get("size_cache")
+        self.size_cache = ImageSizeCache(size_cache) if size_cache else None
+        self.splits = kwargs.get("splits")
+        self.io_workers = kwargs.get("io_workers")
+        if data.endswith((".yaml", ".yml")):
+            self.data_yaml_path = data
+            self.root = os.path.dirname(data)
+        else:
+            self.data_yaml_path = os.path.join(data, "data.yaml")
+            self.root = data
+        self.data_yaml = {}
+        if os.path.exists(self.data_yaml_path):
+            with open(self.data_yaml_path, "r") as f:
+                self.data_yaml = yaml.safe_load(f) or {}
+
+    def _image_size(self, image_path: str, image: pa.Scalar) -> Tuple[int, int]:
+        """
+        Returns the `(width, height)` of an image from the header of its
+        already-read bytes, or from the size cache.
+        """
+        if self.size_cache is None:
+            return image_size(image.as_buffer())
+        mtime_ns = os.stat(image_path).st_mtime_ns
+        size = self.size_cache.get(image_path, mtime_ns)
+        if size is None:
+            size = image_size(image.as_buffer())
+            self.size_cache.put(image_path, mtime_ns, size)
+        return size
 
     def _load_yolo_metadata(self, max_class_id: int = 0):
         """
         Loads the class names from the data.yaml file.
         If not found, it will generate a default mapping.
         """
-        data_yaml_path = os.path.join(self.data, "data.yaml")
-        if os.path.exists(data_yaml_path):
-            with open(data_yaml_path, "r") as f:
-                data_yaml = yaml.safe_load(f)
-                if "names" in data_yaml:
-                    self.metadata.class_names = {
-                        i: name for i, name in enumerate(data_yaml["names"])
-                    }
-                    return
+        names = self.data_yaml.get("names")
+        if isinstance(names, dict):
+            self.metadata.class_names = {int(i): name for i, name in names.items()}
+            return
+        if names:
+            self.metadata.class_names = {i: name for i, name in enumerate(names)}
+            return
 
         # If no class names are found, generate default ones
         if not self.metadata.class_names:
             num_classes = max_class_id + 1
             self.metadata.class_names = {i: str(i) for i in range(num_classes)}
 
+    def _dataset_root(self) -> str:
+        """
+        Returns the directory that the split paths of data.yaml are relative to.
+
+        As in Ultralytics, a relative `path` is resolved against the current
+        working directory. If it does not exist there, it is resolved against
+        the directory of data.yaml instead of the Ultralytics datasets
+        directory. Without a `path`, the directory of data.yaml is the root.
+        """
+        path = self.data_yaml.get("path")
+        if not path:
+            return self.root
+        if os.path.isabs(path) or os.path.exists(path):
+            return os.path.abspath(path)
+        return os.path.join(self.root, path)
+
+    def _split_images(self, source: Any, executor: Optional[Executor]) -> List[str]:
+        """
+        Lists the images of a split given in data.yaml as a directory, a text
+        file with one image path per line, or a list of those.
+
+        As in Ultralytics, a path starting with `../` that does not exist is
+        retried without it, for exports (e.g. Roboflow) that write
+        `train: ../train/images` next to the `train` directory.
+        """
+        root = self._dataset_root()
+        sources = source if isinstance(source, list) else [source]
+        directories, images = [], []
+        for source in sources:
+            path = os.path.normpath(os.path.join(root, source))
+            if not os.path.exists(path) and source.startswith("../"):
+                path = os.path.normpath(os.path.join(root, source[3:]))
+            if path.endswith(".txt"):
+                list_dir = os.path.dirname(path)
+                with open(path, "r") as f:
+                    images.extend(
+                        os.path.normpath(os.path.join(list_dir, line.strip()))
+                        for line in f
+                        if line.strip()
+                    )
+            else:
+                directories.append(path)
+        return images + scan_files(directories, IMAGE_EXTENSIONS, executor)
+
+    def _image_files(self, executor: Optional[Executor]) -> Tuple[List[str], Optional[List[str]]]:
+        """
+        Returns the paths of the images and, if the dataset has splits, the split
+        of each image.
+        """
+        splits = self.splits or [split for split in SPLITS if self.data_yaml.get(split)]
+        if isinstance(splits, str):
+            splits = [splits]
+        if splits:
+            image_files, image_splits = [], []
+            seen = set()
+            for split in splits:
+                if not self.data_yaml.get(split):
+                    raise ValueError(f"Split '{split}' is not defined in {self.data_yaml_path}")
+                for image_file in self._split_images(self.data_yaml[split], executor):
+                    if image_file not in seen:
+                        seen.add(image_file)
+                        image_files.append(image_file)
+                        image_splits.append(split)
+            return image_files, image_splits
+
+        # The coco128 dataset has a subdirectory with the same name.
+        data_dir = os.path.join(self.root, "coco128")
+        if not os.path.exists(data_dir):
+            data_dir = self.root
+        image_dir = os.path.join(data_dir, "images", "train2017")
+        image_files = [
+            os.path.join(image_dir, file)
+            for file in sorted(os.listdir(image_dir))
+            if file.endswith(IMAGE_EXTENSIONS)
+        ]
+        return image_files, None
+
+    @staticmethod
+    def _load_labels(
+        image_files: List[str], executor: Optional[Executor]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Reads the label files of all images in a single pass.
+
+        Each file is parsed in bulk with NumPy, and the rows of all files are
+        concatenated into flat arrays. Without an executor, the files are read
+        serially.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The offsets of the rows
+                of each image, the int64 class ids and the `(N, 4)` float32
+                boxes.
+        """
+        label_paths = (label_path(p) for p in image_files)
+        if executor is None:
+            label_files = map(_read_label_file, label_paths)
+        else:
+            label_files = executor.map(_read_label_file, label_paths, chunksize=64)
+        values = [rows if rows is not None else np.zeros((0, 5)) for rows in label_files]
+        lengths = np.array([len(rows) for rows in values], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        values = np.concatenate(values) if values else np.zeros((0, 5))
+        labels = values[:, 0].astype(np.int64)
+        bboxes = np.round(values[:, 1:], 6).astype(np.float32)
+        return offsets, labels, bboxes
+
     def to_batches(
         self, batch_size: int = 1024
     ) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
-        # The coco128 dataset has a subdirectory with the same name.
-        data_dir = os.path.join(self.data, "coco128")
-        if not os.path.exists(data_dir):
-            data_dir = self.data
-
-        image_dir = os.path.join(data_dir, "images", "train2017")
-        label_dir = os.path.join(data_dir, "labels", "train2017")
-
-        image_files = []
-        for file in sorted(os.listdir(image_dir)):
-            if file.endswith((".jpg", ".png", ".jpeg")):
-                image_files.append(os.path.join(image_dir, file))
-
-        label_files = []
-        for file in sorted(os.listdir(label_dir)):
-            if file.endswith(".txt"):
-                label_files.append(os.path.join(label_dir, file))
-
-        # First pass to determine the max_class_id
-        max_class_id = 0
-        for label_path in label_files:
-            with open(label_path, "r") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    class_id = int(parts[0])
-                    if class_id > max_class_id:
-                        max_class_id = class_id
-        
+        # With io_workers=0, the files are listed and read serially.
+        io_pool = (
+            ThreadPoolExecutor(max_workers=self.io_workers)
+            if self.io_workers != 0
+            else contextlib.nullcontext()
+        )
+        with io_pool as executor:
+            image_files, image_splits = self._image_files(executor)
+            label_offsets, labels, bboxes = self._load_labels(image_files, executor)
+        max_class_id = int(labels.max()) if len(labels) else 0
         self._load_yolo_metadata(max_class_id)
 
-        for i in range(0, len(image_files), batch_size):
-            batch_image_files = image_files[i : i + batch_size]
-
-            images_data = []
-            all_bboxes = []
-            all_labels = []
-            heights = []
-            widths = []
-            file_names = []
-
-            for image_path in batch_image_files:
-                with open(image_path, "rb") as f:
-                    img_bytes = f.read()
-                    images_data.append(img_bytes)
-                with Image.open(image_path) as img:
-                    width, height = img.size
+        # The batches are read by the prefetching image reader, one ahead.
+        batched_indices, batched_path_indices = itertools.tee(
+            batch_ranges(len(image_files), batch_size)
+        )
+        batched_images = prefetch_binary(
+            (image_files[indices.start : indices.stop] for indices in batched_path_indices),
+            self.io_workers,
+        )
+        try:
+            for indices, images in zip(batched_indices, batched_images):
+                i = indices.start
+                batch_image_files = image_files[indices.start : indices.stop]
+                heights = []
+                widths = []
+                file_names = []
+
+                for image_path, image in zip(batch_image_files, images):
+                    width, height = self._image_size(image_path, image)
                     widths.append(width)
                     heights.append(height)
                     file_names.append(os.path.basename(image_path))
 
-                label_path = os.path.join(label_dir, os.path.basename(os.path.splitext(image_path)[0]) + ".txt")
-                if label_path not in label_files:
-                    all_bboxes.append([])
-                    all_labels.append([])
-                    continue
-
-                bboxes = []
-                labels = []
-                with open(label_path, "r") as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        class_id = int(parts[0])
-                        x_center, y_center, width, height = map(float, parts[1:])
-
-                        bboxes.append(
-                            [
-                                round(x, 6)
-                                for x in [x_center, y_center, width, height]
-                            ]
-                        )
-                        labels.append(class_id)
-                all_bboxes.append(bboxes)
-                all_labels.append(labels)
-
-            batch = pa.RecordBatch.from_arrays(
-                [
-                    pa.array(images_data, type=pa.binary()),
-                    pa.array(all_bboxes, type=pa.list_(pa.list_(pa.float32()))),
-                    pa.array(all_labels, type=pa.list_(pa.int64())),
+                starts = label_offsets[i : i + len(batch_image_files)]
+                ends = label_offsets[i + 1 : i + len(batch_image_files) + 1]
+                rows = concat_ranges(starts, ends)
+                image_offsets = lengths_to_offsets(ends - starts)
+                bbox_offsets = np.arange(0, 4 * len(rows) + 1, 4, dtype=np.int32)
+                all_bboxes = pa.ListArray.from_arrays(
+                    image_offsets,
+                    pa.ListArray.from_arrays(bbox_offsets, pa.array(bboxes[rows].ravel())),
+                )
+                all_labels = pa.ListArray.from_arrays(image_offsets, pa.array(labels[rows]))
+
+                arrays = [
+                    images,
+                    all_bboxes,
+                    all_labels,
                     pa.array(heights, type=pa.int64()),
                     pa.array(widths, type=pa.int64()),
                     pa.array(file_names, type=pa.string()),
-                ],
-                names=["image", "bbox", "label", "height", "width", "file_name"],
-            )
-            yield batch
+                ]
+                names = ["image", "bbox", "label", "height", "width", "file_name"]
+                if image_splits is not None:
+                    arrays.append(
+                        pa.array(image_splits[i : i + len(batch_image_files)], type=pa.string())
+                    )
+                    names.append("split")
+                yield pa.RecordBatch.from_arrays(arrays, names=names)
+        finally:
+            if self.size_cache is not None:
+                self.size_cache.save()
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import json
+import operator
 from typing import Generator
 
 import pyarrow as pa
@@ -44,7 +45,7 @@ class PairedTextDataset(BaseDataset):
                 for line in f:
                     record = json.loads(line)
                     process_record(record)
-                    if len(sentence1s) == batch_size:
+                    if len(sentence1s) >= operator.index(batch_size):
                         yield pa.RecordBatch.from_arrays(
                             [
                                 pa.array(sentence1s, type=pa.string()),
@@ -57,7 +58,7 @@ class PairedTextDataset(BaseDataset):
         else:
             for record in self.data:
                 process_record(record)
-                if len(sentence1s) == batch_size:
+                if len(sentence1s) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [
                             pa.array(sentence1s, type=pa.string()),
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import json
+import operator
 from typing import Generator
 
 import pyarrow as pa
@@ -45,7 +46,7 @@ class RankingDataset(BaseDataset):
                 for line in f:
                     record = json.loads(line)
                     process_record(record)
-                    if len(queries) == batch_size:
+                    if len(queries) >= operator.index(batch_size):
                         yield pa.RecordBatch.from_arrays(
                             [
                                 pa.array(queries, type=pa.string()),
@@ -57,7 +58,7 @@ class RankingDataset(BaseDataset):
         else:
             for record in self.data:
                 process_record(record)
-                if len(queries) == batch_size:
+                if len(queries) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [
                             pa.array(queries, type=pa.string()),
@@ -14,16 +14,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import io
-import json
+import contextlib
+import itertools
+import multiprocessing
 import os
-from typing import Generator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator, List
 
-import numpy as np
 import pyarrow as pa
-from PIL import Image, ImageDraw
 
 from atlas.tasks.data_model.base import BaseDataset
+from atlas.tasks.segmentation.masks import (
+    MASK_FORMATS,
+    MASK_TYPES,
+    encode_masks,
+    polygon_masks,
+)
+from atlas.utils.coco import CocoIndex
+from atlas.utils.image import prefetch_binary, prefetch_map
 
 
 class CocoSegmentationDataset(BaseDataset):
@@ -31,11 +39,23 @@ class CocoSegmentationDataset(BaseDataset):
     A dataset that reads data from a COCO JSON file for segmentation tasks.
     """
 
+    image_columns = ["image"]
+
     def __init__(self, data: str, **kwargs):
         super().__init__(data)
         self.image_root = kwargs.get("image_root")
         if self.image_root is None:
             self.image_root = self._infer_image_root()
+        self.io_workers = kwargs.get("io_workers")
+        self.stream_annotations = kwargs.get("stream_annotations", False)
+        self.mask_workers = kwargs.get("mask_workers", 0)
+        self.mask_format = kwargs.get("mask_format", "png")
+        if self.mask_format not in MASK_FORMATS:
+            raise ValueError(
+                f"Unsupported mask format: {self.mask_format}. "
+                f"Expected one of {MASK_FORMATS}."
+            )
+        self.metadata.misc["mask_format"] = self.mask_format
 
     def _infer_image_root(self) -> str:
         """
@@ -50,99 +70,123 @@ class CocoSegmentationDataset(BaseDataset):
                 return image_dir
         return annotation_dir
 
+    def _image_path(self, file_name: str) -> str:
+        """
+        Resolves the path of an image from its COCO file name.
+        """
+        if self.image_root:
+            return os.path.join(self.image_root, file_name)
+        return file_name
+
     def to_batches(self, batch_size: int = 1024, **kwargs) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
-        with open(self.data, "r") as f:
-            coco_data = json.load(f)
-
-        images = {image["id"]: image for image in coco_data["images"]}
-        annotations_by_image = {}
-        for ann in coco_data["annotations"]:
-            annotations_by_image.setdefault(ann["image_id"], []).append(ann)
-        if "categories" in coco_data:
-            self.metadata.class_names = {cat["id"]: cat["name"] for cat in coco_data["categories"]}
-
-        image_ids = list(images.keys())
-
-        for i in range(0, len(image_ids), batch_size):
-            batch_image_ids = image_ids[i : i + batch_size]
-
-            images_data = []
-            all_bboxes = []
-            all_masks = []
-            all_labels = []
-            heights = []
-            widths = []
-            file_names = []
-
-            for image_id in batch_image_ids:
-                image_info = images[image_id]
-                image_path = (
-                    os.path.join(self.image_root, image_info["file_name"])
-                    if self.image_root
-                    else image_info["file_name"]
+        return self.partition_to_batches(self._load_index(), batch_size=batch_size)
+
+    def partitions(self, num_partitions: int) -> List[CocoIndex]:
+        """
+        Splits the images into `num_partitions` contiguous shards.
+
+        The annotation file is parsed once, and each partition is a compact
+        index of only the images, annotations and captions of its shard.
+        """
+        return self._load_index().shards(num_partitions)
+
+    def _load_index(self) -> CocoIndex:
+        index = CocoIndex.from_file(
+            self.data, streaming=self.stream_annotations, with_segmentation=True
+        )
+        if index.categories:
+            self.metadata.class_names = index.class_names
+        return index
+
+    def partition_to_batches(
+        self, partition: CocoIndex, batch_size: int = 1024
+    ) -> Generator[pa.RecordBatch, None, None]:
+        """
+        Yields the batches of the images of one partition index.
+        """
+        index = partition
+        if index.categories:
+            self.metadata.class_names = index.class_names
+
+        # The batches are read by the prefetching image and mask readers, one
+        # ahead.
+        batched_image_indices, batched_path_indices, batched_mask_indices = itertools.tee(
+            index.image_batches(batch_size), 3
+        )
+        batched_image_paths = (
+            [self._image_path(index.file_names[k]) for k in batch_image_indices]
+            for batch_image_indices in batched_path_indices
+        )
+        batched_images = prefetch_binary(batched_image_paths, self.io_workers)
+        batched_mask_jobs = (
+            [
+                (
+                    int(index.heights[k]),
+                    int(index.widths[k]),
+                    [index.segmentation(ann) for ann in index.annotations(k)],
+                    self.mask_format,
                 )
-                with open(image_path, "rb") as f:
-                    images_data.append(f.read())
-
-                annotations = annotations_by_image.get(image_id, [])
-                bboxes = [ann["bbox"] for ann in annotations]
-                labels = [ann["category_id"] for ann in annotations]
-                masks = []
-                for ann in annotations:
-                    mask = np.zeros(
-                        (image_info["height"], image_info["width"]), dtype=np.uint8
-                    )
-                    if isinstance(ann["segmentation"], list):
-                        for seg in ann["segmentation"]:
-                            poly = np.array(seg).reshape((len(seg) // 2, 2))
-                            img = Image.new(
-                                "L", (image_info["width"], image_info["height"]), 0
-                            )
-                            ImageDraw.Draw(img).polygon(
-                                tuple(map(tuple, poly)), outline=1, fill=1
-                            )
-                            mask = np.maximum(mask, np.array(img))
-                    else:
-                        from pycocotools import mask as mask_utils
-                        rle = mask_utils.frPyObjects(
-                            ann["segmentation"],
-                            image_info["height"],
-                            image_info["width"],
-                        )
-                        mask = np.maximum(mask, mask_utils.decode(rle))
-                    img = Image.fromarray(mask * 255)  # scale mask to 0-255
-                    buf = io.BytesIO()
-                    img.save(buf, format='PNG')
-                    masks.append(buf.getvalue())
-
-                all_bboxes.append(bboxes)
-                all_masks.append(masks)
-                all_labels.append(labels)
-                heights.append(image_info["height"])
-                widths.append(image_info["width"])
-                file_names.append(image_info["file_name"])
-
-            batch = pa.RecordBatch.from_arrays(
-                [
-                    pa.array(images_data, type=pa.binary()),
-                    pa.array(all_bboxes, type=pa.list_(pa.list_(pa.float32()))),
-                    pa.array(all_masks, type=pa.list_(pa.binary())),
-                    pa.array(all_labels, type=pa.list_(pa.int64())),
-                    pa.array(heights, type=pa.int64()),
-                    pa.array(widths, type=pa.int64()),
-                    pa.array(file_names, type=pa.string()),
-                ],
-                names=[
-                    "image",
-                    "bbox",
-                    "mask",
-                    "label",
-                    "height",
-                    "width",
-                    "file_name",
-                ],
+                for k in batch_image_indices
+            ]
+            for batch_image_indices in batched_mask_indices
+        )
+
+        # Polygons are passed through as-is, so there is nothing to rasterize.
+        rasterize_masks = self.mask_format != "polygon"
+        # Lance is not fork-safe, so the workers are spawned.
+        mask_pool = (
+            ProcessPoolExecutor(
+                max_workers=self.mask_workers,
+                mp_context=multiprocessing.get_context("spawn"),
             )
-            yield batch
+            if self.mask_workers and rasterize_masks
+            else contextlib.nullcontext()
+        )
+        with mask_pool as executor:
+            if rasterize_masks:
+                batched_masks_data = prefetch_map(encode_masks, batched_mask_jobs, executor)
+            else:
+                batched_masks_data = (None for _ in batched_mask_indices)
+            for batch_image_indices, images, masks_data in zip(
+                batched_image_indices, batched_images, batched_masks_data
+            ):
+                all_bboxes = []
+                all_labels = []
+
+                for k in batch_image_indices:
+                    annotations = index.annotations(k)
+                    all_bboxes.append(index.bboxes(annotations))
+                    all_labels.append(index.labels(annotations))
+
+                if masks_data is None:
+                    masks = polygon_masks(index, batch_image_indices)
+                else:
+                    masks = pa.array(masks_data, type=MASK_TYPES[self.mask_format])
+
+                heights, widths = index.image_sizes(batch_image_indices)
+                file_names = index.file_names[batch_image_indices.start : batch_image_indices.stop]
+
+                batch = pa.RecordBatch.from_arrays(
+                    [
+                        images,
+                        pa.array(all_bboxes, type=pa.list_(pa.list_(pa.float32()))),
+                        masks,
+                        pa.array(all_labels, type=pa.list_(pa.int64())),
+                        heights,
+                        widths,
+                        pa.array(file_names, type=pa.string()),
+                    ],
+                    names=[
+                        "image",
+                        "bbox",
+                        "mask",
+                        "label",
+                        "height",
+                        "width",
+                        "file_name",
+                    ],
+                )
+                yield batch
@@ -0,0 +1,189 @@
+# Atlas: A data-centric AI framework
+#
+# Copyright (c) 2024-present, Atlas Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+from PIL import Image, ImageDraw
+
+from atlas.utils.arrow import concat_ranges, lengths_to_offsets
+from atlas.utils.coco import CocoIndex
+
+MASK_FORMATS = ("png", "rle", "polygon")
+
+POLYGON_MASK_TYPE = pa.struct(
+    [
+        pa.field("polygons", pa.list_(pa.list_(pa.float32()))),
+        pa.field("rle", pa.binary()),
+    ]
+)
+
+MASK_TYPES = {
+    "png": pa.list_(pa.binary()),
+    "rle": pa.list_(pa.list_(pa.int32())),
+    "polygon": pa.list_(POLYGON_MASK_TYPE),
+}
+
+
+def rasterize(segmentation: Any, height: int, width: int) -> np.ndarray:
+    """
+    Rasterizes a COCO segmentation into a binary (0/1) mask.
+
+    Args:
+        segmentation (Any): Either a list of flat polygon coordinate arrays or a
+            COCO RLE object.
+        height (int): The height of the image.
+        width (int): The width of the image.
+
+    Returns:
+        np.ndarray: A `(height, width)` uint8 mask.
+    """
+    if isinstance(segmentation, list):
+        img = Image.new("L", (width, height), 0)
+        draw = ImageDraw.Draw(img)
+        for seg in segmentation:
+            poly = np.asarray(seg).reshape((len(seg) // 2, 2))
+            draw.polygon(tuple(map(tuple, poly)), outline=1, fill=1)
+        return np.array(img)
+
+    from pycocotools import mask as mask_utils
+    return mask_utils.decode(to_compressed_rle(segmentation, height, width))
+
+
+def to_compressed_rle(segmentation: Dict[str, Any], height: int, width: int) -> Dict[str, Any]:
+    """
+    Converts a COCO RLE object, compressed or not, to a pycocotools compressed
+    RLE without decoding it.
+    """
+    counts = segmentation["counts"]
+    if isinstance(counts, list):
+        from pycocotools import mask as mask_utils
+        return mask_utils.frPyObjects(segmentation, height, width)
+    if isinstance(counts, str):
+        counts = counts.encode("ascii")
+    return {"size": [height, width], "counts": counts}
+
+
+def encode_rle(mask: np.ndarray) -> np.ndarray:
+    """
+    Encodes a binary mask as uncompressed COCO RLE counts.
+
+    The counts are run lengths over the column-major (Fortran order) pixels,
+    starting with a run of zeros, so they can be used as the `counts` of a
+    pycocotools RLE of size `[height, width]`.
+    """
+    pixels = mask.ravel(order="F") > 0
+    boundaries = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], boundaries, [pixels.size])))
+    if pixels.size and pixels[0]:
+        counts = np.concatenate(([0], counts))
+    return counts.astype(np.int32)
+
+
+def decode_rle(counts: Union[List[int], np.ndarray], height: int, width: int) -> np.ndarray:
+    """
+    Decodes uncompressed COCO RLE counts into a `(height, width)` uint8 mask.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    values = (np.arange(len(counts)) % 2).astype(np.uint8)
+    return np.repeat(values, counts).reshape((height, width), order="F")
+
+
+def decode_mask(mask: Any, height: int, width: int, mask_format: str = "png") -> np.ndarray:
+    """
+    Decodes a single instance mask as stored in a segmentation dataset.
+
+    Args:
+        mask (Any): One element of the `mask` column.
+        height (int): The height of the image.
+        width (int): The width of the image.
+        mask_format (str, optional): The format the dataset was sunk with. It is
+            recorded in the dataset metadata under `misc["mask_format"]`.
+            Defaults to "png".
+
+    Returns:
+        np.ndarray: A `(height, width)` uint8 mask where non-zero pixels belong to
+            the instance.
+    """
+    if mask_format == "png":
+        return np.array(Image.open(io.BytesIO(mask)).convert("L"))
+    if mask_format == "rle":
+        return decode_rle(mask, height, width)
+    if mask_format == "polygon":
+        if mask["rle"] is not None:
+            return rasterize({"size": [height, width], "counts": mask["rle"]}, height, width)
+        return rasterize(mask["polygons"], height, width)
+    raise ValueError(f"Unsupported mask format: {mask_format}")
+
+
+def encode_masks(job: Tuple[int, int, List[Any], str]) -> List[Any]:
+    """
+    Encodes the segmentations of one image in the given mask format.
+
+    This is a module-level function so that it can be run in a process pool.
+    """
+    height, width, segmentations, mask_format = job
+    masks = []
+    for segmentation in segmentations:
+        mask = rasterize(segmentation, height, width)
+        if mask_format == "rle":
+            masks.append(encode_rle(mask))
+        else:
+            img = Image.fromarray(mask * 255)  # scale mask to 0-255
+            buf = io.BytesIO()
+            img.save(buf, format='PNG')
+            masks.append(buf.getvalue())
+    return masks
+
+
+def polygon_masks(index: CocoIndex, image_indices: range) -> pa.ListArray:
+    """
+    Builds the `mask` column for a range of images without rasterizing.
+
+    Each instance is a struct holding its polygons as `list<list<float32>>`
+    (flat x, y coordinates) and, for RLE segmentations, the compressed COCO RLE
+    counts. The column is assembled directly from the offsets of the index.
+    """
+    anns, ann_counts = index.batch_annotations(image_indices)
+
+    polygon_starts = index.polygon_offsets[anns]
+    polygon_ends = index.polygon_offsets[anns + 1]
+    polygons = concat_ranges(polygon_starts, polygon_ends)
+    coord_starts = index.coord_offsets[polygons]
+    coord_ends = index.coord_offsets[polygons + 1]
+    coords = index.coords[concat_ranges(coord_starts, coord_ends)].astype(np.float32)
+
+    polygon_array = pa.ListArray.from_arrays(
+        lengths_to_offsets(polygon_ends - polygon_starts),
+        pa.ListArray.from_arrays(lengths_to_offsets(coord_ends - coord_starts), pa.array(coords)),
+    )
+
+    rles = [None] * len(anns)
+    if index.rles:
+        ann_images = np.repeat(np.arange(image_indices.start, image_indices.stop), ann_counts)
+        for i, (ann, k) in enumerate(zip(anns.tolist(), ann_images.tolist())):
+            segmentation = index.rles.get(ann)
+            if segmentation is not None:
+                height, width = int(index.heights[k]), int(index.widths[k])
+                rles[i] = to_compressed_rle(segmentation, height, width)["counts"]
+
+    instances = pa.StructArray.from_arrays(
+        [polygon_array, pa.array(rles, type=pa.binary())],
+        fields=list(POLYGON_MASK_TYPE),
+    )
+    return pa.ListArray.from_arrays(lengths_to_offsets(ann_counts), instances)
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import operator
 from typing import Generator, Dict, Any
 
 import pyarrow as pa
@@ -42,7 +43,7 @@ class SimilarityDataset(BaseDataset):
                     sentence1_list.append(record["sentence1"])
                     sentence2_list.append(record["sentence2"])
                     similarity_score_list.append(record["similarity_score"])
-                    if len(sentence1_list) == batch_size:
+                    if len(sentence1_list) >= operator.index(batch_size):
                         yield pa.RecordBatch.from_arrays(
                             [
                                 pa.array(sentence1_list, type=pa.string()),
@@ -57,7 +58,7 @@ class SimilarityDataset(BaseDataset):
                 sentence1_list.append(record["sentence1"])
                 sentence2_list.append(record["sentence2"])
                 similarity_score_list.append(record["similarity_score"])
-                if len(sentence1_list) == batch_size:
+                if len(sentence1_list) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [
                             pa.array(sentence1_list, type=pa.string()),
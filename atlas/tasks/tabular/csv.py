@@ -14,12 +14,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Generator
+from typing import Any, Dict, Generator, Optional
 
-import pandas as pd
+import lance
 import pyarrow as pa
 from pyarrow import csv
-import lance
 
 from atlas.tasks.data_model.base import BaseDataset
 
@@ -27,8 +26,31 @@ from atlas.tasks.data_model.base import BaseDataset
 class CsvDataset(BaseDataset):
     """
     A dataset that reads data from a CSV file.
+
+    The file is parsed incrementally with the Arrow CSV reader, so only a few
+    blocks are held in memory at a time regardless of the size of the file.
     """
 
+    def __init__(self, data: str, **kwargs):
+        super().__init__(data)
+        self.block_size: Optional[int] = kwargs.get("block_size")
+        self.column_types: Optional[Dict[str, Any]] = kwargs.get("column_types")
+
+    def _open_reader(self) -> pa.RecordBatchReader:
+        """
+        Opens a streaming reader over the CSV file.
+
+        Blocks are parsed in parallel. Column types are inferred from the first
+        block unless they are given in `column_types`.
+        """
+        read_options = csv.ReadOptions(use_threads=True)
+        if self.block_size:
+            read_options.block_size = self.block_size
+        convert_options = csv.ConvertOptions(column_types=self.column_types or {})
+        return csv.open_csv(
+            self.data, read_options=read_options, convert_options=convert_options
+        )
+
     def to_lance(
         self,
         uri: str,
@@ -39,15 +61,35 @@ class CsvDataset(BaseDataset):
         """
         Converts the dataset to Lance format and saves it to the given URI.
         """
-        df = pd.read_csv(self.data)
-        df.columns = df.columns.str.replace('.', '_', regex=False)
-        lance.write_dataset(df, uri, mode=mode, **kwargs)
+        kwargs.pop("num_workers", None)
+        kwargs.pop("batch_bytes", None)
+        kwargs.pop("blob_images", None)
+        reader = self._open_reader()
+        schema = pa.schema(
+            [field.with_name(field.name.replace(".", "_")) for field in reader.schema]
+        )
+        batches = (
+            pa.RecordBatch.from_arrays(batch.columns, schema=schema) for batch in reader
+        )
+        lance.write_dataset(
+            pa.RecordBatchReader.from_batches(schema, batches), uri, mode=mode, **kwargs
+        )
 
     def to_batches(self, batch_size: int = 1024) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
-
-        reader = pd.read_csv(self.data, chunksize=batch_size)
-        for chunk in reader:
-            yield pa.Table.from_pandas(chunk).to_batches()[0]
+        pending = []
+        num_pending = 0
+        for block in self._open_reader():
+            pending.append(block)
+            num_pending += block.num_rows
+            if num_pending < batch_size:
+                continue
+            table = pa.Table.from_batches(pending).combine_chunks()
+            for offset in range(0, table.num_rows - batch_size + 1, batch_size):
+                yield table.slice(offset, batch_size).to_batches()[0]
+            num_pending = table.num_rows % batch_size
+            pending = table.slice(table.num_rows - num_pending).to_batches() if num_pending else []
+        if num_pending:
+            yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
@@ -14,10 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Generator
+import glob
+import operator
+from typing import Any, Generator, List, Optional, Union
 
 import lance
 import pyarrow as pa
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
 
 from atlas.tasks.data_model.base import BaseDataset
@@ -25,26 +28,116 @@ from atlas.tasks.data_model.base import BaseDataset
 
 class ParquetDataset(BaseDataset):
     """
-    A dataset that reads data from a Parquet file.
+    A dataset that reads data from a Parquet file, a directory of Parquet files
+    (optionally hive-partitioned, e.g. `year=2024/part-0.parquet`) or a glob
+    pattern matching Parquet files.
+
+    The files are scanned as a single Arrow dataset: row groups are read and
+    decoded in parallel and streamed batch by batch, so the data never has to
+    fit in memory.
     """
 
+    def __init__(self, data: str, **kwargs):
+        super().__init__(data)
+        self.columns: Optional[List[str]] = kwargs.get("columns")
+        self.filter: Optional[ds.Expression] = self._to_expression(kwargs.get("filters"))
+
+    @staticmethod
+    def _to_expression(filters: Any) -> Optional[ds.Expression]:
+        """
+        Converts filters given in the `pq.read_table` DNF format, e.g.
+        `[("year", ">=", 2020)]`, to a dataset expression.
+        """
+        if filters is None or isinstance(filters, ds.Expression):
+            return filters
+        return pq.filters_to_expression(filters)
+
+    def _dataset(self) -> ds.Dataset:
+        """
+        Opens the Parquet file(s) as an Arrow dataset.
+        """
+        source: Union[str, List[str]] = self.data
+        if glob.has_magic(self.data):
+            source = sorted(glob.glob(self.data, recursive=True))
+            if not source:
+                raise FileNotFoundError(f"No Parquet files match {self.data}")
+        return ds.dataset(source, format="parquet", partitioning="hive")
+
+    def _scan(
+        self, dataset: ds.Dataset, fragment: Optional[ds.Fragment] = None, batch_size: int = 1024
+    ) -> ds.Scanner:
+        """
+        Creates a scanner with the column projection and filter pushed down into
+        the Parquet reader.
+        """
+        options = dict(
+            columns=self.columns, filter=self.filter, batch_size=batch_size, use_threads=True
+        )
+        if fragment is not None:
+            return ds.Scanner.from_fragment(fragment, schema=dataset.schema, **options)
+        return dataset.scanner(**options)
+
     def to_lance(
         self,
         uri: str,
         mode: str = "create",
         batch_size: int = 1024,
+        num_workers: Optional[int] = None,
         **kwargs,
     ) -> None:
         """
         Converts the dataset to Lance format and saves it to the given URI.
+
+        If `num_workers` is greater than 1 and the dataset has several files,
+        the files are split between worker processes that write Lance fragments
+        in parallel.
         """
-        table = pq.read_table(self.data)
-        lance.write_dataset(table, uri, mode=mode, **kwargs)
+        if num_workers and num_workers > 1:
+            super().to_lance(
+                uri, mode=mode, batch_size=batch_size, num_workers=num_workers, **kwargs
+            )
+            return
+        kwargs.pop("batch_bytes", None)
+        kwargs.pop("blob_images", None)
+        kwargs.pop("image_root", None)
+        reader = self._scan(self._dataset(), batch_size=batch_size or 1024).to_reader()
+        lance.write_dataset(reader, uri, mode=mode, **kwargs)
 
     def to_batches(self, batch_size: int = 1024) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
-        parquet_file = pq.ParquetFile(self.data)
-        for batch in parquet_file.iter_batches(batch_size=batch_size):
-            yield batch
+        yield from self._scan(
+            self._dataset(), batch_size=operator.index(batch_size)
+        ).to_batches()
+
+    def partitions(self, num_partitions: int) -> Optional[List[List[str]]]:
+        """
+        Splits the files of the dataset into up to `num_partitions` contiguous
+        groups. A single file is not partitioned.
+        """
+        paths = [fragment.path for fragment in self._dataset().get_fragments()]
+        if len(paths) < 2:
+            return None
+        num_partitions = min(num_partitions, len(paths))
+        step, extra = divmod(len(paths), num_partitions)
+        groups = []
+        start = 0
+        for i in range(num_partitions):
+            end = start + step + (1 if i < extra else 0)
+            groups.append(paths[start:end])
+            start = end
+        return groups
+
+    def partition_to_batches(
+        self, partition: List[str], batch_size: int = 1024
+    ) -> Generator[pa.RecordBatch, None, None]:
+        """
+        Yields the batches of a group of files returned by `partitions`.
+        """
+        dataset = self._dataset()
+        paths = set(partition)
+        for fragment in dataset.get_fragments():
+            if fragment.path in paths:
+                # A resizable batch size is applied per file.
+                yield from self._scan(dataset, fragment, operator.index(batch_size)).to_batches()
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import operator
 from typing import Generator
 
 import pyarrow as pa
@@ -34,7 +35,7 @@ class TextDataset(BaseDataset):
             lines = []
             for line in f:
                 lines.append(line.strip())
-                if len(lines) == batch_size:
+                if len(lines) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [pa.array(lines, type=pa.string())],
                         names=["text"],
@@ -15,12 +15,14 @@
 # limitations under the License.
 
 import json
+import operator
 import os
 from typing import Generator
 
 import pyarrow as pa
 
 from atlas.tasks.data_model.base import BaseDataset
+from atlas.utils.image import image_field, read_binary_array
 
 
 class VisionLanguageDataset(BaseDataset):
@@ -29,35 +31,36 @@ class VisionLanguageDataset(BaseDataset):
     with "image" (path) and "text" fields.
     """
 
+    image_columns = ["image"]
+
     def to_batches(self, batch_size: int = 1024, **kwargs) -> Generator[pa.RecordBatch, None, None]:
         """
         Yields batches of the dataset as Arrow RecordBatches.
         """
         with open(self.data, "r") as f:
-            images, texts = [], []
+            image_paths, texts = [], []
             for line in f:
                 record = json.loads(line)
                 image_path = record.get("image")
                 if image_path and os.path.exists(image_path):
-                    with open(image_path, "rb") as img_f:
-                        images.append(img_f.read())
+                    image_paths.append(image_path)
                 else:
-                    images.append(None)
+                    image_paths.append(None)
                 texts.append(record.get("text", ""))
 
-                if len(images) == batch_size:
+                if len(image_paths) >= operator.index(batch_size):
                     yield pa.RecordBatch.from_arrays(
                         [
-                            pa.array(images, type=pa.binary()),
+                            read_binary_array(image_paths),
                             pa.array(texts, type=pa.string()),
                         ],
                         names=["image", "text"],
                     )
-                    images, texts = [], []
-            if images:
+                    image_paths, texts = [], []
+            if image_paths:
                 yield pa.RecordBatch.from_arrays(
                     [
-                        pa.array(images, type=pa.binary()),
+                        read_binary_array(image_paths),
                         pa.array(texts, type=pa.string()),
                     ],
                     names=["image", "text"],
@@ -70,7 +73,7 @@ class VisionLanguageDataset(BaseDataset):
         """
         return pa.schema(
             [
-                pa.field("image", pa.binary()),
+                image_field("image"),
                 pa.field("text", pa.string()),
             ]
         )
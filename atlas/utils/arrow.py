@@ -0,0 +1,37 @@
+# Atlas: A data-centric AI framework
+#
+# Copyright (c) 2024-present, Atlas Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+
+def concat_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Returns the concatenation of `range(start, end)` for each pair, without a
+    Python loop.
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shifts = starts - np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.repeat(shifts, lengths) + np.arange(total)
+
+
+def lengths_to_offsets(lengths: np.ndarray) -> np.ndarray:
+    """
+    Converts per-row lengths to int32 Arrow list offsets.
+    """
+    return np.concatenate(([0], np.cumsum(lengths))).astype(np.int32)
@@ -0,0 +1,460 @@
+# Atlas: A data-centric AI framework
+#
+# Copyright (c) 2024-present, Atlas Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+from array import array
+from typing import Any, Dict, Generator, Iterable, List, Optional, SupportsIndex, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+
+from atlas.utils.arrow import concat_ranges
+from atlas.utils.system import batch_ranges
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class _JsonStream:
+    """
+    A minimal pull parser over a text file, used to walk a top-level JSON object
+    without loading the whole document.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def advance(self) -> str:
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+                # A value that ends exactly at the end of the buffer may be a
+                # truncated number or literal, so only accept it at EOF.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill() and self.pos >= len(self.buf):
+                raise ValueError("Unexpected end of JSON input")
+
+
+def stream_json_arrays(
+    path: str, keys: Iterable[str], chunk_size: int = 1 << 20
+) -> Generator[Tuple[str, Any], None, None]:
+    """
+    Incrementally yields the elements of top-level arrays in a JSON object.
+
+    Only one array element is decoded at a time, so memory use is bounded by
+    the largest element rather than by the size of the file.
+
+    Args:
+        path (str): The path to a JSON file whose root is an object.
+        keys (Iterable[str]): The top-level keys whose array elements should be
+            yielded. All other values are skipped.
+        chunk_size (int, optional): The number of characters read at a time.
+            Defaults to 1 MiB.
+
+    Yields:
+        Generator[Tuple[str, Any], None, None]: `(key, element)` pairs in file
+            order.
+    """
+    keys = set(keys)
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f, chunk_size)
+        if stream.advance() != "{":
+            raise ValueError(f"Expected a JSON object at the root of {path}")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.decode()
+            if stream.advance() != ":":
+                raise ValueError(f"Malformed JSON object in {path}")
+            if stream.peek() == "[":
+                stream.advance()
+                if stream.peek() == "]":
+                    stream.advance()
+                else:
+                    while True:
+                        item = stream.decode()
+                        if key in keys:
+                            yield key, item
+                        char = stream.advance()
+                        if char == "]":
+                            break
+                        if char != ",":
+                            raise ValueError(f"Malformed JSON array '{key}' in {path}")
+            else:
+                stream.decode()
+            char = stream.advance()
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Malformed JSON object in {path}")
+
+
+def _take_lists(offsets: np.ndarray, values: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Takes the lists at `indices` from flat `values` with `offsets`, and
+    returns the offsets and values of the taken lists.
+    """
+    starts = offsets[indices]
+    ends = offsets[indices + 1]
+    new_offsets = np.concatenate(([0], np.cumsum(ends - starts))).astype(np.int64)
+    return new_offsets, values[concat_ranges(starts, ends)]
+
+
+class CocoIndex:
+    """
+    A compact, array-backed index over a COCO annotation file.
+
+    Numeric annotation fields are kept in typed arrays and variable-length
+    fields (keypoints, polygons) in flat value arrays with offsets, instead of
+    one Python dict per annotation. Annotations are grouped by image through a
+    sorted offset index, so the annotations of an image are a contiguous slice.
+
+    COCO image ids may be integers or strings, so `image_ids`,
+    `ann_image_ids` and `caption_image_ids` hold dense integer codes of the
+    ids, assigned in the order the ids first occur in the file.
+    """
+
+    def __init__(self, with_segmentation: bool = False):
+        self.with_segmentation = with_segmentation
+        self.categories: List[Dict[str, Any]] = []
+        self._id_codes: Dict[Any, int] = {}
+
+        self.image_ids = array("q")
+        self.heights = array("q")
+        self.widths = array("q")
+        self.has_height = array("b")
+        self.has_width = array("b")
+        self.file_names: List[str] = []
+
+        self.ann_image_ids = array("q")
+        self.ann_category_ids = array("q")
+        self.ann_has_category = array("b")
+        self.ann_bboxes = array("f")
+        self.ann_has_bbox = array("b")
+        self.keypoint_offsets = array("q", [0])
+        self.keypoints = array("f")
+        self.ann_has_keypoints = array("b")
+
+        # Polygons are stored as two levels of offsets: annotation -> polygons
+        # and polygon -> coordinates. RLE segmentations are comparatively rare
+        # (crowd annotations) and are kept as-is, keyed by annotation index.
+        self.polygon_offsets = array("q", [0])
+        self.coord_offsets = array("q", [0])
+        self.coords = array("d")
+        self.rles: Dict[int, Any] = {}
+
+        self.caption_image_ids = array("q")
+        self.captions: List[str] = []
+
+    @classmethod
+    def from_file(
+        cls, path: str, streaming: bool = False, with_segmentation: bool = False
+    ) -> "CocoIndex":
+        """
+        Builds an index from a COCO annotation file.
+
+        Args:
+            path (str): The path to the COCO JSON file.
+            streaming (bool, optional): If True, the file is parsed incrementally
+                so the full JSON document is never held in memory. Defaults to
+                False.
+            with_segmentation (bool, optional): If True, segmentation polygons
+                and RLEs are indexed as well. Defaults to False.
+
+        Returns:
+            CocoIndex: The finalized index.
+        """
+        index = cls(with_segmentation=with_segmentation)
+        sections = ("images", "annotations", "captions", "categories")
+        if streaming:
+            items = stream_json_arrays(path, sections)
+        else:
+            with open(path, "r") as f:
+                coco_data = json.load(f)
+            items = (
+                (key, item) for key in sections for item in coco_data.get(key, [])
+            )
+
+        for key, item in items:
+            if key == "images":
+                index.add_image(item)
+            elif key == "annotations":
+                index.add_annotation(item)
+            elif key == "captions":
+                index.add_caption(item)
+            else:
+                index.categories.append(item)
+        index.finalize()
+        return index
+
+    def _id_code(self, image_id: Any) -> int:
+        return self._id_codes.setdefault(image_id, len(self._id_codes))
+
+    def add_image(self, image: Dict[str, Any]) -> None:
+        self.image_ids.append(self._id_code(image["id"]))
+        # Sizes may be floats (e.g. 480.0) or null, which becomes a null size.
+        height = image.get("height", 0)
+        width = image.get("width", 0)
+        self.has_height.append(height is not None)
+        self.has_width.append(width is not None)
+        self.heights.append(int(height) if height is not None else 0)
+        self.widths.append(int(width) if width is not None else 0)
+        self.file_names.append(image.get("file_name", ""))
+
+    def add_caption(self, caption: Dict[str, Any]) -> None:
+        self.caption_image_ids.append(self._id_code(caption["image_id"]))
+        self.captions.append(caption["caption"])
+
+    def add_annotation(self, ann: Dict[str, Any]) -> None:
+        self.ann_image_ids.append(self._id_code(ann["image_id"]))
+
+        category_id = ann.get("category_id")
+        self.ann_has_category.append(category_id is not None)
+        self.ann_category_ids.append(int(category_id) if category_id is not None else 0)
+
+        bbox = ann.get("bbox")
+        self.ann_has_bbox.append(bbox is not None)
+        self.ann_bboxes.extend(bbox if bbox is not None else (0.0, 0.0, 0.0, 0.0))
+
+        keypoints = ann.get("keypoints")
+        self.ann_has_keypoints.append(keypoints is not None)
+        if keypoints is not None:
+            self.keypoints.extend(keypoints)
+        self.keypoint_offsets.append(len(self.keypoints))
+
+        if self.with_segmentation:
+            segmentation = ann.get("segmentation")
+            if isinstance(segmentation, list):
+                for polygon in segmentation:
+                    self.coords.extend(polygon)
+                    self.coord_offsets.append(len(self.coords))
+            elif segmentation is not None:
+                self.rles[len(self.ann_image_ids) - 1] = segmentation
+            self.polygon_offsets.append(len(self.coord_offsets) - 1)
+
+    def finalize(self) -> None:
+        """
+        Converts the typed arrays to NumPy views and builds the image to
+        annotation offset index.
+        """
+        self._id_codes = {}
+        self.image_ids = np.frombuffer(self.image_ids, dtype=np.int64)
+        self.heights = np.frombuffer(self.heights, dtype=np.int64)
+        self.widths = np.frombuffer(self.widths, dtype=np.int64)
+        self.has_height = np.frombuffer(self.has_height, dtype=np.bool_)
+        self.has_width = np.frombuffer(self.has_width, dtype=np.bool_)
+
+        self.ann_image_ids = np.frombuffer(self.ann_image_ids, dtype=np.int64)
+        self.ann_category_ids = np.frombuffer(self.ann_category_ids, dtype=np.int64)
+        self.ann_has_category = np.frombuffer(self.ann_has_category, dtype=np.bool_)
+        self.ann_bboxes = np.frombuffer(self.ann_bboxes, dtype=np.float32).reshape(-1, 4)
+        self.ann_has_bbox = np.frombuffer(self.ann_has_bbox, dtype=np.bool_)
+        self.keypoint_offsets = np.frombuffer(self.keypoint_offsets, dtype=np.int64)
+        self.keypoints = np.frombuffer(self.keypoints, dtype=np.float32)
+        self.ann_has_keypoints = np.frombuffer(self.ann_has_keypoints, dtype=np.bool_)
+
+        self.polygon_offsets = np.frombuffer(self.polygon_offsets, dtype=np.int64)
+        self.coord_offsets = np.frombuffer(self.coord_offsets, dtype=np.int64)
+        self.coords = np.frombuffer(self.coords, dtype=np.float64)
+
+        self.caption_image_ids = np.frombuffer(self.caption_image_ids, dtype=np.int64)
+        self._build_groups()
+
+    def _build_groups(self) -> None:
+        self._ann_order, self._ann_starts, self._ann_ends = self._group_by_image(
+            self.ann_image_ids
+        )
+        self._caption_order, self._caption_starts, self._caption_ends = (
+            self._group_by_image(self.caption_image_ids)
+        )
+
+    def _group_by_image(self, owner_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        order = np.argsort(owner_ids, kind="stable")
+        sorted_ids = owner_ids[order]
+        starts = np.searchsorted(sorted_ids, self.image_ids, side="left")
+        ends = np.searchsorted(sorted_ids, self.image_ids, side="right")
+        return order, starts, ends
+
+    @property
+    def class_names(self) -> Dict[int, str]:
+        return {cat["id"]: cat["name"] for cat in self.categories}
+
+    def __len__(self) -> int:
+        return len(self.image_ids)
+
+    def image_batches(self, batch_size: SupportsIndex) -> Generator[range, None, None]:
+        """
+        Yields the image indices in contiguous batches. A resizable batch size
+        is read at the start of each batch.
+        """
+        return batch_ranges(len(self), batch_size)
+
+    def shards(self, num_shards: int) -> List["CocoIndex"]:
+        """
+        Splits the images into `num_shards` contiguous shards, each with its
+        own compact index of only its images, annotations and captions.
+        """
+        bounds = [len(self) * shard // num_shards for shard in range(num_shards + 1)]
+        return [self.subset(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def subset(self, start: int, stop: int) -> "CocoIndex":
+        """
+        Returns an index of the images in `[start, stop)`.
+        """
+        sub = CocoIndex(with_segmentation=self.with_segmentation)
+        sub.categories = self.categories
+        sub.image_ids = self.image_ids[start:stop].copy()
+        sub.heights = self.heights[start:stop].copy()
+        sub.widths = self.widths[start:stop].copy()
+        sub.has_height = self.has_height[start:stop].copy()
+        sub.has_width = self.has_width[start:stop].copy()
+        sub.file_names = self.file_names[start:stop]
+
+        # The annotations are kept in file order.
+        anns = np.sort(self.batch_annotations(range(start, stop))[0])
+        sub.ann_image_ids = self.ann_image_ids[anns]
+        sub.ann_category_ids = self.ann_category_ids[anns]
+        sub.ann_has_category = self.ann_has_category[anns]
+        sub.ann_bboxes = self.ann_bboxes[anns]
+        sub.ann_has_bbox = self.ann_has_bbox[anns]
+        sub.ann_has_keypoints = self.ann_has_keypoints[anns]
+        sub.keypoint_offsets, sub.keypoints = _take_lists(self.keypoint_offsets, self.keypoints, anns)
+
+        if self.with_segmentation:
+            polygon_offsets, polygons = _take_lists(
+                self.polygon_offsets, np.arange(len(self.coord_offsets) - 1), anns
+            )
+            sub.polygon_offsets = polygon_offsets
+            sub.coord_offsets, sub.coords = _take_lists(self.coord_offsets, self.coords, polygons)
+            sub.rles = {
+                i: self.rles[ann] for i, ann in enumerate(anns.tolist()) if ann in self.rles
+            }
+        else:
+            sub.polygon_offsets = np.zeros(1, dtype=np.int64)
+            sub.coord_offsets = np.zeros(1, dtype=np.int64)
+            sub.coords = np.zeros(0, dtype=np.float64)
+
+        captions = np.sort(
+            self._caption_order[
+                concat_ranges(self._caption_starts[start:stop], self._caption_ends[start:stop])
+            ]
+        )
+        sub.caption_image_ids = self.caption_image_ids[captions]
+        sub.captions = [self.captions[i] for i in captions.tolist()]
+        sub._build_groups()
+        return sub
+
+    def annotations(self, image_index: int) -> np.ndarray:
+        """
+        Returns the indices of the annotations of an image, in file order.
+        """
+        return self._ann_order[self._ann_starts[image_index] : self._ann_ends[image_index]]
+
+    def batch_annotations(self, image_indices: range) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the annotations of a contiguous range of images.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The annotation indices of all the
+                images, concatenated, and the number of annotations per image.
+        """
+        starts = self._ann_starts[image_indices.start : image_indices.stop]
+        ends = self._ann_ends[image_indices.start : image_indices.stop]
+        return self._ann_order[concat_ranges(starts, ends)], ends - starts
+
+    def image_sizes(self, image_indices: range) -> Tuple[pa.Array, pa.Array]:
+        """
+        Returns the heights and widths of a range of images as int64 arrays,
+        which are null where the annotation file has a null size.
+        """
+        images = slice(image_indices.start, image_indices.stop)
+        heights = pa.array(self.heights[images], mask=~self.has_height[images])
+        widths = pa.array(self.widths[images], mask=~self.has_width[images])
+        return heights, widths
+
+    def image_captions(self, image_index: int) -> List[str]:
+        order = self._caption_order[
+            self._caption_starts[image_index] : self._caption_ends[image_index]
+        ]
+        return [self.captions[i] for i in order]
+
+    def labels(self, anns: np.ndarray) -> List[Optional[int]]:
+        return [
+            label if has_label else None
+            for label, has_label in zip(
+                self.ann_category_ids[anns].tolist(), self.ann_has_category[anns]
+            )
+        ]
+
+    def bboxes(self, anns: np.ndarray) -> List[Optional[List[float]]]:
+        return [
+            bbox if has_bbox else None
+            for bbox, has_bbox in zip(self.ann_bboxes[anns].tolist(), self.ann_has_bbox[anns])
+        ]
+
+    def keypoints_of(self, anns: np.ndarray) -> List[Optional[List[float]]]:
+        return [
+            self.keypoints[self.keypoint_offsets[i] : self.keypoint_offsets[i + 1]].tolist()
+            if self.ann_has_keypoints[i]
+            else None
+            for i in anns
+        ]
+
+    def segmentation(self, ann: int) -> Union[List[np.ndarray], Any]:
+        """
+        Returns the segmentation of an annotation, either as a list of flat
+        polygon coordinate arrays or as the original RLE object.
+        """
+        ann = int(ann)
+        if ann in self.rles:
+            return self.rles[ann]
+        polygons = range(self.polygon_offsets[ann], self.polygon_offsets[ann + 1])
+        return [
+            self.coords[self.coord_offsets[p] : self.coord_offsets[p + 1]] for p in polygons
+        ]
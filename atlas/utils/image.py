@@ -0,0 +1,401 @@
+# Atlas: A data-centric AI framework
+#
+# Copyright (c) 2024-present, Atlas Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+import os
+import struct
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+from PIL import Image
+
+# Field metadata that makes Lance store a column with blob encoding: the values
+# are kept out of line and scans of the other columns never touch them.
+BLOB_METADATA = {"lance-encoding:blob": "true"}
+
+
+def image_field(name: str, blob: bool = False) -> pa.Field:
+    """
+    Returns the Arrow field used for encoded image columns.
+
+    Images are stored as `large_binary` in every reader. With `blob=True` the
+    column is written with Lance blob encoding, and the images are read back
+    with `LanceDataset.take_blobs` (see `take_images`).
+    """
+    if blob:
+        return pa.field(name, pa.large_binary(), metadata=BLOB_METADATA)
+    return pa.field(name, pa.large_binary(), metadata={"lance:encoding": "binary"})
+
+
+def is_blob_field(field: pa.Field) -> bool:
+    """
+    Checks whether a field of a Lance dataset is blob-encoded.
+    """
+    return "blob" in getattr(field.type, "extension_name", "")
+
+
+def take_images(dataset: Any, column: str, indices: List[int]) -> List[Optional[bytes]]:
+    """
+    Reads the encoded images of the given rows of a Lance dataset, whether the
+    column is stored inline or with blob encoding.
+    """
+    if is_blob_field(dataset.schema.field(column)):
+        return [blob.read() for blob in dataset.take_blobs(column, indices=indices)]
+    return dataset.take(indices, columns=[column]).column(column).to_pylist()
+
+
+# The codecs that decoded images can be encoded with.
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+
+
+def encode_image(img: Image.Image, image_format: str = "png", quality: Optional[int] = None) -> bytes:
+    """
+    Encodes a decoded PIL image.
+
+    Args:
+        img (Image.Image): The image to encode.
+        image_format (str, optional): One of `IMAGE_FORMATS`. PNG is lossless;
+            JPEG and WebP are lossy and much faster to write and smaller.
+            Defaults to "png".
+        quality (Optional[int], optional): The quality (1-100) of lossy codecs.
+            If None, the PIL default is used. Defaults to None.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    options = {}
+    if image_format != "png" and quality is not None:
+        options["quality"] = quality
+    if image_format == "jpeg" and img.mode not in ("RGB", "L", "CMYK"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format=image_format.upper(), **options)
+    return buf.getvalue()
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG start-of-frame markers, which carry the image dimensions. 0xC4 (DHT),
+# 0xC8 (JPG) and 0xCC (DAC) share the range but are not frames.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers that stand alone, without a length field.
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+
+
+def _jpeg_size(data: memoryview) -> Optional[Tuple[int, int]]:
+    """
+    Reads the dimensions of a JPEG from its start-of-frame segment.
+    """
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return width, height
+        (length,) = struct.unpack(">H", data[i + 2 : i + 4])
+        i += 2 + length
+    return None
+
+
+def image_size(data: Any) -> Tuple[int, int]:
+    """
+    Returns the `(width, height)` of an encoded image without decoding it.
+
+    The dimensions of PNG and JPEG images are parsed from the IHDR chunk and
+    the start-of-frame segment. Other formats fall back to PIL, which also
+    only reads the header.
+
+    Args:
+        data (Any): The encoded image, as bytes or any object supporting the
+            buffer protocol (e.g. a `pa.Buffer`).
+
+    Returns:
+        Tuple[int, int]: The width and height of the image.
+    """
+    view = memoryview(data)
+    size = None
+    if view[:8] == PNG_SIGNATURE and len(view) >= 24:
+        size = struct.unpack(">II", view[16:24])
+    elif view[:2] == b"\xff\xd8":
+        size = _jpeg_size(view)
+    if size is None:
+        with Image.open(io.BytesIO(view)) as img:
+            size = img.size
+    return size
+
+
+class ImageSizeCache:
+    """
+    A persistent cache of image dimensions, keyed by file path and modification
+    time.
+
+    The cache is stored as a JSON file. An entry is only used while the
+    modification time of the image is unchanged.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sizes: Dict[str, List[int]] = {}
+        self._dirty = False
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self._sizes = json.load(f)
+
+    def get(self, image_path: str, mtime_ns: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns the cached `(width, height)` of an image, or None.
+        """
+        entry = self._sizes.get(image_path)
+        if entry is None or entry[0] != mtime_ns:
+            return None
+        return entry[1], entry[2]
+
+    def put(self, image_path: str, mtime_ns: int, size: Tuple[int, int]) -> None:
+        """
+        Stores the `(width, height)` of an image.
+        """
+        self._sizes[image_path] = [mtime_ns, size[0], size[1]]
+        self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the cache to disk if it has changed.
+        """
+        if self._dirty:
+            with open(self.path, "w") as f:
+                json.dump(self._sizes, f)
+            self._dirty = False
+
+
+def _scan_dir(path: str, extensions: Tuple[str, ...]) -> Tuple[List[str], List[str]]:
+    """
+    Lists the matching files and the subdirectories of a single directory.
+    """
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(extensions):
+                files.append(entry.path)
+    return files, subdirs
+
+
+def scan_files(
+    directories: List[str], extensions: Tuple[str, ...], executor: Optional[Executor] = None
+) -> List[str]:
+    """
+    Recursively lists the files with the given extensions under directories.
+
+    Directories are listed with `os.scandir`, which gets the file types from the
+    directory entries without a `stat` per file. If an executor is given, the
+    directories of the tree are listed concurrently.
+
+    Args:
+        directories (List[str]): The directories to scan.
+        extensions (Tuple[str, ...]): The lowercase file extensions to match.
+        executor (Optional[Executor], optional): The executor to list
+            directories on. Defaults to None.
+
+    Returns:
+        List[str]: The sorted paths of the matching files.
+    """
+    files = []
+    if executor is None:
+        pending = list(directories)
+        while pending:
+            dir_files, subdirs = _scan_dir(pending.pop(), extensions)
+            files.extend(dir_files)
+            pending.extend(subdirs)
+        return sorted(files)
+
+    pending = {executor.submit(_scan_dir, path, extensions) for path in directories}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            dir_files, subdirs = future.result()
+            files.extend(dir_files)
+            pending.update(executor.submit(_scan_dir, path, extensions) for path in subdirs)
+    return sorted(files)
+
+
+def _read_into(path: str, buffer: memoryview) -> None:
+    """
+    Reads a whole file into a preallocated buffer of the file's size.
+    """
+    with open(path, "rb", buffering=0) as f:
+        num_read = 0
+        while num_read < len(buffer):
+            n = f.readinto(buffer[num_read:])
+            if not n:
+                break
+            num_read += n
+    if num_read != len(buffer):
+        raise IOError(f"{path} changed size while it was being read")
+
+
+def _start_binary_read(
+    paths: List[Optional[str]], executor: Optional[Executor] = None
+) -> Callable[[], pa.LargeBinaryArray]:
+    """
+    Allocates one contiguous data buffer for a batch of files and starts reading
+    the files into it.
+
+    Returns a function that waits for the reads and wraps the buffers in an
+    Arrow array.
+    """
+    sizes = np.array([os.path.getsize(p) if p is not None else 0 for p in paths], dtype=np.int64)
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+
+    data = np.empty(int(offsets[-1]), dtype=np.uint8)
+    view = memoryview(data)
+    reads = [
+        (path, view[offsets[i] : offsets[i + 1]]) for i, path in enumerate(paths) if path is not None
+    ]
+    if executor is None:
+        for path, buffer in reads:
+            _read_into(path, buffer)
+        futures = []
+    else:
+        futures = [executor.submit(_read_into, path, buffer) for path, buffer in reads]
+
+    def finish() -> pa.LargeBinaryArray:
+        for future in futures:
+            future.result()
+        valid = np.array([p is not None for p in paths], dtype=bool)
+        null_count = len(paths) - int(valid.sum())
+        validity = pa.py_buffer(np.packbits(valid, bitorder="little")) if null_count else None
+        return pa.Array.from_buffers(
+            pa.large_binary(),
+            len(paths),
+            [validity, pa.py_buffer(offsets), pa.py_buffer(data)],
+            null_count=null_count,
+        )
+
+    return finish
+
+
+def read_binary_array(
+    paths: List[Optional[str]], executor: Optional[Executor] = None
+) -> pa.LargeBinaryArray:
+    """
+    Reads files into an Arrow `large_binary` array.
+
+    The file contents are read straight into a single contiguous data buffer
+    that backs the array, with the offsets computed from the file sizes. This
+    avoids creating a Python `bytes` object per file and copying it again into
+    the array.
+
+    Args:
+        paths (List[Optional[str]]): The files to read. A None path becomes a
+            null element.
+        executor (Optional[Executor], optional): If given, the files are read
+            concurrently on this executor. Defaults to None.
+
+    Returns:
+        pa.LargeBinaryArray: The contents of the files, in the same order as
+            `paths`.
+    """
+    return _start_binary_read(paths, executor)()
+
+
+def prefetch_map(
+    fn: Callable[[Any], Any],
+    item_batches: Iterable[List[Any]],
+    executor: Optional[Executor] = None,
+) -> Generator[List[Any], None, None]:
+    """
+    Applies `fn` to batches of items on an executor, one batch ahead of the
+    consumer.
+
+    The work for batch `i + 1` is submitted before the results of batch `i` are
+    yielded, so it overlaps with whatever the caller does with the current batch
+    (e.g. building Arrow arrays). At most two batches are in flight at a time and
+    results are yielded in input order.
+
+    Args:
+        fn (Callable[[Any], Any]): The function to apply to each item. It must be
+            picklable if `executor` is a process pool.
+        item_batches (Iterable[List[Any]]): The items, grouped into batches.
+        executor (Optional[Executor], optional): The executor to run `fn` on. If
+            None, `fn` is applied serially in the calling thread. Defaults to None.
+
+    Yields:
+        Generator[List[Any], None, None]: The results of each batch, in the same
+            order as the given items.
+    """
+    if executor is None:
+        for items in item_batches:
+            yield [fn(item) for item in items]
+        return
+
+    pending = None
+    for items in item_batches:
+        futures = [executor.submit(fn, item) for item in items]
+        if pending is not None:
+            yield [future.result() for future in pending]
+        pending = futures
+    if pending is not None:
+        yield [future.result() for future in pending]
+
+
+def prefetch_binary(
+    path_batches: Iterable[List[Optional[str]]], io_workers: Optional[int] = None
+) -> Generator[pa.LargeBinaryArray, None, None]:
+    """
+    Reads batches of files into Arrow `large_binary` arrays with a thread pool,
+    one batch ahead of the consumer.
+
+    Each batch is read as with `read_binary_array`.
+
+    Args:
+        path_batches (Iterable[List[Optional[str]]]): The file paths to read,
+            grouped into batches.
+        io_workers (Optional[int], optional): The number of reader threads. If
+            None, the `ThreadPoolExecutor` default is used. If 0, files are
+            read serially in the calling thread. Defaults to None.
+
+    Yields:
+        Generator[pa.LargeBinaryArray, None, None]: The file contents of each
+            batch, in the same order as the given paths.
+    """
+    if io_workers == 0:
+        for paths in path_batches:
+            yield read_binary_array(paths)
+        return
+
+    with ThreadPoolExecutor(max_workers=io_workers) as executor:
+        pending = None
+        for paths in path_batches:
+            finish = _start_binary_read(paths, executor)
+            if pending is not None:
+                yield pending()
+            pending = finish
+        if pending is not None:
+            yield pending()
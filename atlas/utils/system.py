@@ -14,8 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import psutil
+import operator
+import queue
 import shutil
+import threading
+from typing import Any, Generator, Iterable, Optional, SupportsIndex
+
+import psutil
+import pyarrow as pa
 
 def check_ffmpeg():
     """
@@ -40,22 +46,163 @@ def get_available_memory():
     return psutil.virtual_memory().available
 
 
-def get_dynamic_batch_size(row_size_in_bytes: int, fraction: float = 0.1):
+def get_batch_byte_budget(fraction: float = 0.1, max_bytes: int = 64 * 1024 * 1024) -> int:
     """
-    Calculates a dynamic batch size based on the available memory.
+    Calculates the target size of a batch in bytes based on the available memory.
 
     Args:
-        row_size_in_bytes (int): The size of a single row in bytes.
         fraction (float, optional): The fraction of available memory to use.
             Defaults to 0.1.
+        max_bytes (int, optional): The upper bound of the budget. Larger batches
+            do not make writes noticeably faster but do increase peak memory.
+            Defaults to 64 MiB.
 
     Returns:
-        int: The calculated batch size.
+        int: The byte budget of a batch.
+    """
+    return max(1, min(max_bytes, int(get_available_memory() * fraction)))
+
+
+class AdaptiveBatcher:
+    """
+    Sizes the reads of a stream of RecordBatches to roughly `target_bytes`.
+
+    The size of a row is tracked as an exponentially weighted moving average
+    of the batches seen so far, and turned into `batch_size`, the number of
+    rows of the next read. Readers that take their batch size from the batcher
+    (through `operator.index`, e.g. with `batch_ranges`) before each batch
+    read small-row sources in large batches and large-row sources (e.g.
+    images) in small ones. Batches that are still larger than the budget are
+    split by their measured row size, so memory stays bounded when rows grow
+    faster than the estimate. Smaller batches are passed through as-is: the
+    Lance writer buffers rows into its own pages, so concatenating them would
+    only add copies.
     """
-    if row_size_in_bytes <= 0:
-        return 1024  # default batch size
 
-    available_memory = get_available_memory()
-    target_memory = available_memory * fraction
-    batch_size = int(target_memory / row_size_in_bytes)
-    return max(1, batch_size)  # ensure batch size is at least 1
+    def __init__(
+        self,
+        target_bytes: int,
+        batch_size: int = 64,
+        max_batch_size: int = 64 * 1024,
+        smoothing: float = 0.5,
+    ):
+        """
+        Args:
+            target_bytes (int): The maximum size of an output batch in bytes.
+            batch_size (int, optional): The number of rows of the first read,
+                before any row has been measured. Defaults to 64.
+            max_batch_size (int, optional): The upper bound of `batch_size`.
+                Defaults to 65536.
+            smoothing (float, optional): The weight of the newest batch in the
+                moving average of the row size. Defaults to 0.5.
+        """
+        self.target_bytes = max(1, target_bytes)
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.smoothing = smoothing
+        self.row_bytes: Optional[float] = None
+
+    def __index__(self) -> int:
+        return self.batch_size
+
+    def observe(self, batch: pa.RecordBatch) -> None:
+        """
+        Updates the row size estimate, and the size of the next read, with a
+        batch.
+        """
+        if batch.num_rows == 0:
+            return
+        row_bytes = max(1.0, batch.nbytes / batch.num_rows)
+        if self.row_bytes is None:
+            self.row_bytes = row_bytes
+        else:
+            self.row_bytes += self.smoothing * (row_bytes - self.row_bytes)
+        self.batch_size = min(self.max_batch_size, max(1, int(self.target_bytes / self.row_bytes)))
+
+    def rebatch(
+        self, batches: Iterable[pa.RecordBatch]
+    ) -> Generator[pa.RecordBatch, None, None]:
+        """
+        Yields the rows of `batches`, in order, in batches of at most roughly
+        `target_bytes`, and resizes the following reads after each batch.
+        """
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            self.observe(batch)
+            if batch.nbytes <= self.target_bytes:
+                yield batch
+                continue
+            row_bytes = max(1.0, batch.nbytes / batch.num_rows)
+            num_rows = max(1, int(self.target_bytes / row_bytes))
+            for offset in range(0, batch.num_rows, num_rows):
+                yield batch.slice(offset, num_rows)
+
+
+def batch_ranges(num_rows: int, batch_size: SupportsIndex) -> Generator[range, None, None]:
+    """
+    Splits `range(num_rows)` into contiguous batches.
+
+    The size of each batch is read from `batch_size` when the batch starts, so
+    a resizable batch size (an `AdaptiveBatcher`) applies from the next batch.
+    """
+    start = 0
+    while start < num_rows:
+        stop = min(num_rows, start + max(1, operator.index(batch_size)))
+        yield range(start, stop)
+        start = stop
+
+
+def prefetch(iterable: Iterable[Any], depth: int = 1) -> Generator[Any, None, None]:
+    """
+    Iterates over `iterable` on a background thread, up to `depth` items ahead
+    of the consumer.
+
+    This overlaps producing the next item (e.g. downloading and decoding the
+    next batch of a streaming dataset) with consuming the current one. Items
+    are yielded in order, and an exception raised by the iterable is re-raised
+    in the consumer.
+
+    Args:
+        iterable (Iterable[Any]): The items to iterate over.
+        depth (int, optional): The number of items buffered ahead. Defaults to 1.
+
+    Yields:
+        Generator[Any, None, None]: The items of `iterable`.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # Unblocks the producer if the consumer stops early.
+        stop.set()
+        thread.join()
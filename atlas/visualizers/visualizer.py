@@ -25,6 +25,8 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 
 from atlas.tasks.data_model.base import BaseDataset
+from atlas.tasks.segmentation.masks import decode_mask
+from atlas.utils.image import is_blob_field, take_images
 
 
 def visualize(uri: str, num_samples: int = 5, output_file: str = None):
@@ -50,6 +52,8 @@ def visualize(uri: str, num_samples: int = 5, output_file: str = None):
 
     sample_indices = random.sample(range(total_rows), min(num_samples, total_rows))
     samples = dataset.take(sample_indices).to_pydict()
+    if "image" in samples and is_blob_field(dataset.schema.field("image")):
+        samples["image"] = take_images(dataset, "image", sample_indices)
     metadata = BaseDataset.get_metadata(uri)
     if metadata:
         samples["class_names"] = metadata.class_names
@@ -118,9 +122,11 @@ def visualize(uri: str, num_samples: int = 5, output_file: str = None):
 
                 if "mask" in row:
                     masks = row["mask"]
-                    for idx, mask_bytes in enumerate(masks):
-                        mask_image = Image.open(io.BytesIO(mask_bytes)).convert("L")
-                        mask_np = np.array(mask_image)
+                    mask_format = metadata.misc.get("mask_format", "png")
+                    for idx, mask in enumerate(masks):
+                        mask_np = decode_mask(
+                            mask, row.get("height"), row.get("width"), mask_format
+                        )
                         # Generate a random color for each mask
                         color = np.random.randint(0, 255, size=3)
                         rgba_mask = np.zeros((*mask_np.shape, 4), dtype=np.uint8)
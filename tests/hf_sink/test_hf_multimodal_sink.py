@@ -15,17 +15,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import unittest
 import os
 import shutil
 import json
+import zipfile
 import lance
-from datasets import Dataset, Image, Audio
+from datasets import Dataset, Image, Audio, ClassLabel, Features, List, Value
 from PIL import Image as PILImage
 import numpy as np
 import pyarrow as pa
 
 from atlas.data_sinks import sink
+from atlas.tasks.hf.hf import HFDataset
 
 
 class HFMultimodalDataSinkTest(unittest.TestCase):
@@ -104,5 +107,141 @@ class HFMultimodalDataSinkTest(unittest.TestCase):
             original_audio_bytes = f.read()
         self.assertEqual(retrieved_audio_bytes, original_audio_bytes)
 
+    def test_archived_image_path(self):
+        archive_path = os.path.abspath(os.path.join(self.test_dir, "images.zip"))
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            archive.write(self.image_path, "images/test.png")
+        data = {"image": [{"bytes": None, "path": f"zip://images/test.png::{archive_path}"}]}
+        dataset = Dataset.from_dict(data, features=Features({"image": Image()}))
+        uri = os.path.join(self.test_dir, "archive.lance")
+        sink(dataset, uri, task="hf")
+
+        table = lance.dataset(uri).to_table()
+        with open(self.image_path, "rb") as f:
+            self.assertEqual(table.column("image")[0].as_py(), f.read())
+
+    def test_arrow_native_columns(self):
+        features = Features({
+            "id": Value("int64"),
+            "text": Value("string"),
+            "tokens": List(Value("string")),
+            "meta": {"score": Value("float32"), "source": Value("string")},
+            "label": ClassLabel(names=["neg", "pos"]),
+            "tags": List(ClassLabel(names=["a", "b", "c"])),
+            "image": Image(),
+        })
+        data = {
+            "id": list(range(5)),
+            "text": [f"text {i}" for i in range(5)],
+            "tokens": [["a"] * i for i in range(5)],
+            "meta": [{"score": i / 2, "source": f"s{i}"} for i in range(5)],
+            "label": [0, 1, -1, 1, 1],
+            "tags": [[0, 2], [], [1], [2, 2], [0]],
+            "image": [self.image_path] * 5,
+        }
+        dataset = Dataset.from_dict(data, features=features).select([4, 3, 2, 1, 0])
+        uri = os.path.join(self.test_dir, "native.lance")
+        sink(dataset, uri, task="hf", batch_size=2)
+
+        table = lance.dataset(uri).to_table()
+        self.assertEqual(table.column("id").to_pylist(), [4, 3, 2, 1, 0])
+        self.assertEqual(table.column("tokens").to_pylist(), [["a"] * i for i in range(4, -1, -1)])
+        self.assertEqual(table.column("meta").to_pylist()[0], {"score": 2.0, "source": "s4"})
+        self.assertEqual(table.schema.field("label").type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertEqual(table.column("label").to_pylist(), ["pos", "pos", None, "pos", "neg"])
+        self.assertEqual(table.column("tags").to_pylist(), [["a"], ["c", "c"], ["b"], [], ["a", "c"]])
+        with open(self.image_path, "rb") as f:
+            self.assertEqual(table.column("image").to_pylist(), [f.read()] * 5)
+
+        sink(dataset, uri, task="hf", expand_level=1)
+        table = lance.dataset(uri).to_table()
+        self.assertEqual(table.column("meta_source").to_pylist(), ["s4", "s3", "s2", "s1", "s0"])
+
+    def test_append_class_labels(self):
+        features = Features({
+            "label": ClassLabel(names=["neg", "pos"]),
+            "tags": List(ClassLabel(names=["a", "b", "c"])),
+        })
+        dataset = Dataset.from_dict({"label": [1, 0], "tags": [[0, 2], []]}, features=features)
+        # Datasets written before ClassLabels were dictionary encoded store their names as strings.
+        uri = os.path.join(self.test_dir, "labels.lance")
+        lance.write_dataset(
+            pa.table({"label": pa.array(["neg"]), "tags": pa.array([["b"]])}), uri
+        )
+
+        sink(dataset, uri, task="hf", mode="append")
+        table = lance.dataset(uri).to_table()
+        self.assertEqual(table.schema.field("label").type, pa.string())
+        self.assertEqual(table.column("label").to_pylist(), ["neg", "pos", "neg"])
+        self.assertEqual(table.column("tags").to_pylist(), [["b"], ["a", "c"], []])
+
+    def test_nested_expansion(self):
+        features = Features({
+            "id": Value("int64"),
+            "meta": {"source": Value("string"), "extra": {"score": Value("float32")}},
+            "objects": List({"bbox": List(Value("float32")), "category": ClassLabel(names=["cat", "dog"])}),
+        })
+        data = {
+            "id": list(range(4)),
+            "meta": [{"source": f"s{i}", "extra": {"score": i / 2}} for i in range(3)] + [None],
+            "objects": [
+                [{"bbox": [0.0, 1.0], "category": 0}],
+                [],
+                None,
+                [{"bbox": [2.0], "category": 1}, {"bbox": [3.0], "category": 0}],
+            ],
+        }
+        dataset = Dataset.from_dict(data, features=features).select([3, 2, 1, 0])
+        uri = os.path.join(self.test_dir, "expanded.lance")
+        sink(dataset, uri, task="hf", expand_level=2, batch_size=3)
+
+        table = lance.dataset(uri).to_table()
+        self.assertEqual(
+            table.column_names,
+            ["id", "meta_extra_score", "meta_source", "objects_bbox", "objects_category"],
+        )
+        self.assertEqual(table.column("meta_source").to_pylist(), [None, "s2", "s1", "s0"])
+        self.assertEqual(table.column("meta_extra_score").to_pylist(), [None, 1.0, 0.5, 0.0])
+        self.assertEqual(table.column("objects_bbox").to_pylist(), [[[2.0], [3.0]], None, [], [[0.0, 1.0]]])
+        self.assertEqual(table.column("objects_category").to_pylist(), [["dog", "cat"], None, [], ["cat"]])
+
+    def test_iterable_dataset(self):
+        features = Features({
+            "id": Value("int64"),
+            "label": ClassLabel(names=["neg", "pos"]),
+            "image": Image(),
+        })
+        data = {"id": list(range(5)), "label": [0, 1, 0, 1, 1], "image": [self.image_path] * 5}
+        dataset = Dataset.from_dict(data, features=features).to_iterable_dataset(num_shards=2)
+        uri = os.path.join(self.test_dir, "iterable.lance")
+        sink(dataset, uri, task="hf", batch_size=2)
+
+        table = lance.dataset(uri).to_table()
+        self.assertEqual(table.column("id").to_pylist(), list(range(5)))
+        self.assertEqual(table.column("label").to_pylist(), ["neg", "pos", "neg", "pos", "pos"])
+        with open(self.image_path, "rb") as f:
+            self.assertEqual(table.column("image").to_pylist(), [f.read()] * 5)
+
+    def test_pil_image_encoding(self):
+        images = [PILImage.new("RGBA", (16, 8), color=(0, 255, 0, 255)), None, {"path": self.image_path}]
+        for image_format, signature in [("png", b"\x89PNG"), ("jpeg", b"\xff\xd8"), ("webp", b"RIFF")]:
+            for encode_workers in [0, 2]:
+                dataset = HFDataset(
+                    Dataset.from_dict({"image": [self.image_path]}).cast_column("image", Image()),
+                    image_format=image_format,
+                    image_quality=80,
+                    encode_workers=encode_workers,
+                )
+                encoded = dataset._process_column(images, Image()).to_pylist()
+                self.assertTrue(encoded[0].startswith(signature))
+                self.assertEqual(PILImage.open(io.BytesIO(encoded[0])).size, (16, 8))
+                self.assertIsNone(encoded[1])
+                with open(self.image_path, "rb") as f:
+                    self.assertEqual(encoded[2], f.read())
+
+        with self.assertRaises(ValueError):
+            HFDataset(Dataset.from_dict({"x": [1]}), image_format="gif")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
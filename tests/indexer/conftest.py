@@ -0,0 +1,59 @@
+import os
+
+import pytest
+import torch
+from transformers import (
+    BertConfig,
+    BertModel,
+    BertTokenizerFast,
+    CLIPConfig,
+    CLIPImageProcessor,
+    CLIPModel,
+)
+
+
+@pytest.fixture
+def tiny_text_model(tmp_path_factory):
+    """Returns a function that saves a small randomly initialized BERT model
+    and its tokenizer, and returns its path."""
+
+    def save():
+        path = str(tmp_path_factory.mktemp("text_model"))
+        words = ["this", "is", "a", "short", "longer", "sentence", "with", "more", "tokens"]
+        vocab_path = os.path.join(path, "vocab.txt")
+        with open(vocab_path, "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+        BertTokenizerFast(vocab_file=vocab_path).save_pretrained(path)
+        config = BertConfig(
+            vocab_size=len(words) + 5,
+            hidden_size=16,
+            num_hidden_layers=1,
+            num_attention_heads=2,
+            intermediate_size=32,
+        )
+        torch.manual_seed(0)
+        BertModel(config).save_pretrained(path)
+        return path
+
+    return save
+
+
+@pytest.fixture
+def tiny_image_model(tmp_path_factory):
+    """Returns a function that saves a small randomly initialized CLIP model
+    and its image processor, and returns its path."""
+
+    def save():
+        path = str(tmp_path_factory.mktemp("image_model"))
+        layers = dict(hidden_size=16, intermediate_size=32, num_hidden_layers=1, num_attention_heads=2)
+        config = CLIPConfig(
+            text_config=dict(vocab_size=64, bos_token_id=0, eos_token_id=1, **layers),
+            vision_config=dict(image_size=32, patch_size=8, **layers),
+            projection_dim=8,
+        )
+        torch.manual_seed(0)
+        CLIPModel(config).save_pretrained(path)
+        CLIPImageProcessor(size={"shortest_edge": 32}, crop_size={"height": 32, "width": 32}).save_pretrained(path)
+        return path
+
+    return save
@@ -1,6 +1,7 @@
 import os
 import shutil
 import uuid
+from unittest import mock
 
 import lance
 import numpy as np
@@ -152,4 +153,51 @@ def test_list_indexes(capsys, lance_dataset):
     captured = capsys.readouterr()
     assert "vector" in captured.out
     assert "vector_idx" in captured.out
-    assert "id" not in captured.out or "id_idx" not in captured.out
\ No newline at end of file
+    assert "id" not in captured.out or "id_idx" not in captured.out
+
+
+def test_incremental_vector_index(lance_dataset, tiny_text_model):
+    """Tests that re-indexing after an append only embeds the appended rows."""
+    model_path = tiny_text_model()
+    index_kwargs = dict(model=model_path, vector_column_name="text_embeddings", num_partitions=2, num_sub_vectors=4)
+    idx = indexer_api.Indexer(lance_dataset)
+    idx.create_index("text", "vector", **index_kwargs)
+    vectors = idx.table.to_lance().to_table(columns=["text_embeddings"]).column("text_embeddings")
+
+    new_rows = pa.table({
+        "vector": pa.array([np.random.rand(128).astype("float32") for _ in range(10)], type=pa.list_(pa.float32(), 128)),
+        "id": list(range(256, 266)),
+        "text": [f"this is new text {i}" if i % 3 else None for i in range(10)],
+    })
+    lance.write_dataset(new_rows, lance_dataset, mode="append")
+    idx = indexer_api.Indexer(lance_dataset)
+
+    vectorize = indexer_api.Vectorizer.vectorize
+    with mock.patch.object(indexer_api.Vectorizer, "vectorize", autospec=True, side_effect=vectorize) as patched:
+        idx.create_index("text", "vector", incremental=True, **index_kwargs)
+    assert sum(len(call.args[1]) for call in patched.call_args_list) == 6
+
+    dataset = lance.dataset(lance_dataset)
+    table = dataset.to_table(columns=["text_embeddings"])
+    assert table.column("text_embeddings").null_count == 4
+    assert table.column("text_embeddings").slice(0, 256).equals(vectors)
+    assert dataset.stats.index_stats("text_embeddings_idx")["num_unindexed_rows"] == 0
+
+    # The rows with null text are not selected again.
+    with mock.patch.object(indexer_api.Vectorizer, "vectorize", autospec=True, side_effect=vectorize) as patched:
+        idx.create_index("text", "vector", incremental=True, **index_kwargs)
+    patched.assert_not_called()
+    assert lance.dataset(lance_dataset).version == dataset.version
+
+    # Without `incremental`, or with another model, the vectors are rebuilt.
+    other_model = tiny_text_model()
+    with mock.patch.object(indexer_api.Vectorizer, "vectorize", autospec=True, side_effect=vectorize) as patched:
+        idx.create_index("text", "vector", incremental=True, **dict(index_kwargs, model=other_model))
+    assert sum(len(call.args[1]) for call in patched.call_args_list) == 266
+    assert lance.dataset(lance_dataset).to_table().column("text_embeddings").null_count == 4
+    field = lance.dataset(lance_dataset).schema.field("text_embeddings")
+    assert field.metadata[b"atlas:model"] == other_model.encode()
+
+    # A column that the Indexer did not create is never overwritten.
+    with pytest.raises(ValueError):
+        idx.create_index("text", "vector", model=model_path)
@@ -0,0 +1,119 @@
+import io
+import os
+from unittest import mock
+
+import lance
+import numpy as np
+import pyarrow as pa
+import torch
+from PIL import Image
+
+from atlas.index.vectorizer.cache import EmbeddingCache, content_hash
+from atlas.index.vectorizer.vectorizer import Vectorizer, token_budget_batches
+
+
+def test_text_mean_pooling(tiny_text_model):
+    vectorizer = Vectorizer(model_name=tiny_text_model(), modality="text")
+    texts = ["this is short", "this is a longer sentence with more tokens", "a"]
+    embeddings = vectorizer.vectorize(pa.array(texts), batch_size=2)
+
+    assert embeddings.type == pa.list_(pa.float32(), 16)
+    assert len(embeddings) == 3
+
+    # Padding must not change the embedding of a sentence.
+    with torch.no_grad():
+        for text, embedding in zip(texts, embeddings.values.to_numpy().reshape(3, 16)):
+            inputs = vectorizer.tokenizer(text, return_tensors="pt")
+            expected = vectorizer.model(**inputs).last_hidden_state[0].mean(dim=0).numpy()
+            np.testing.assert_allclose(embedding, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_token_budget_batches(tiny_text_model):
+    lengths = [5, 1, 9, 3, 3, 7]
+    batches = token_budget_batches(lengths, batch_size=4, max_tokens=12)
+    assert [list(batch) for batch in batches] == [[1, 3, 4], [0], [5], [2]]
+    assert [list(batch) for batch in token_budget_batches(lengths, batch_size=4)] == [[1, 3, 4, 0], [5, 2]]
+
+    vectorizer = Vectorizer(model_name=tiny_text_model(), modality="text")
+    texts = ["a longer sentence with more tokens", "a", "this is short", "short"]
+    expected = vectorizer.vectorize_batch(texts, batch_size=1)
+    np.testing.assert_allclose(
+        vectorizer.vectorize_batch(texts, batch_size=4, max_tokens=16), expected, rtol=1e-4, atol=1e-5
+    )
+
+
+def test_image_decode_workers(tiny_image_model):
+    images = []
+    for _ in range(5):
+        buffer = io.BytesIO()
+        Image.fromarray(np.random.randint(0, 255, (40, 50, 3), dtype=np.uint8)).save(buffer, "JPEG")
+        images.append(buffer.getvalue())
+
+    model_path = tiny_image_model()
+    serial = Vectorizer(model_name=model_path, modality="image", decode_workers=0)
+    expected = serial.vectorize(images, batch_size=5)
+    assert expected.type == pa.list_(pa.float32(), 8)
+    assert serial.vectorize([None]).type == expected.type
+
+    pipelined = Vectorizer(model_name=model_path, modality="image", decode_workers=2)
+    embeddings = pipelined.vectorize(pa.array(images, type=pa.large_binary()), batch_size=2)
+    np.testing.assert_allclose(embeddings.values.to_numpy(), expected.values.to_numpy(), rtol=1e-4, atol=1e-5)
+
+
+def test_embedding_cache(tiny_text_model, tmp_path):
+    vectorizer = Vectorizer(model_name=tiny_text_model(), modality="text")
+    cache = EmbeddingCache(str(tmp_path / "cache.lance"), vectorizer.model_name)
+    texts = ["this is short", "a", "this is short"]
+    expected = vectorizer.vectorize(texts)
+
+    with mock.patch.object(vectorizer, "vectorize_batch", wraps=vectorizer.vectorize_batch) as patched:
+        embeddings = vectorizer.vectorize(texts, cache=cache)
+        # Duplicate values are embedded once.
+        assert patched.call_args.args[0] == ["this is short", "a"]
+        np.testing.assert_allclose(embeddings.values.to_numpy(), expected.values.to_numpy(), rtol=1e-6)
+
+        patched.reset_mock()
+        embeddings = vectorizer.vectorize(["a", "this is a sentence", "this is short"], cache=cache)
+        assert patched.call_args.args[0] == ["this is a sentence"]
+        np.testing.assert_allclose(embeddings.values.to_numpy()[:16], expected.values.to_numpy()[16:32], rtol=1e-6)
+
+        patched.reset_mock()
+        vectorizer.vectorize(texts, cache=cache)
+        patched.assert_not_called()
+
+    # Embeddings are buffered until they are flushed, with an index on each key.
+    assert not os.path.exists(cache.uri)
+    cache.flush()
+    dataset = lance.dataset(cache.uri)
+    assert dataset.count_rows() == 3
+    assert sorted(index.name for index in dataset.describe_indices()) == ["hash_idx", "model_idx"]
+    reopened = EmbeddingCache(cache.uri, vectorizer.model_name)
+    assert len(reopened.get([content_hash("a"), content_hash("b")])) == 1
+
+    # Embeddings are cached per model.
+    assert EmbeddingCache(cache.uri, "other-model").get([content_hash("a")]) == {}
+
+
+def test_embedding_cache_compaction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.lance"), "model", write_batch_size=2, max_fragments=2)
+    for i in range(4):
+        cache.put([f"{i}a", f"{i}b"], np.full((2, 4), i, dtype=np.float32))
+    dataset = lance.dataset(cache.uri)
+    assert dataset.count_rows() == 8
+    assert len(dataset.get_fragments()) <= 2
+    np.testing.assert_array_equal(cache.get(["3b"])["3b"], np.full(4, 3, dtype=np.float32))
+
+
+def test_vectorize_nulls(tiny_text_model, tmp_path):
+    vectorizer = Vectorizer(model_name=tiny_text_model(), modality="text")
+    cache = EmbeddingCache(str(tmp_path / "cache.lance"), vectorizer.model_name)
+    expected = vectorizer.vectorize(["a"])
+    for embeddings in [vectorizer.vectorize([None, "a", None]), vectorizer.vectorize([None, "a", None], cache=cache)]:
+        assert embeddings.null_count == 2
+        assert embeddings[1].values.to_numpy().tolist() == expected[0].values.to_numpy().tolist()
+
+    # A batch of only nulls has the vector type of the model.
+    for data in [[None, None], pa.array([None, None], type=pa.string())]:
+        embeddings = vectorizer.vectorize(data, cache=cache)
+        assert embeddings.type == pa.list_(pa.float32(), 16)
+        assert embeddings.null_count == 2
@@ -10,6 +10,9 @@ import pyarrow as pa
 from PIL import Image
 
 from atlas.data_sinks import sink
+from atlas.tasks.data_model.base import BaseDataset
+from atlas.tasks.segmentation.coco import CocoSegmentationDataset
+from atlas.tasks.segmentation.masks import MASK_TYPES, decode_mask
 
 
 class CocoSegmentationSinkTest(unittest.TestCase):
@@ -73,6 +76,68 @@ class CocoSegmentationSinkTest(unittest.TestCase):
         self.assertEqual(mask.shape, (100, 100))
         self.assertTrue(np.any(mask > 0))
 
+    def test_sink_coco_segmentation_mask_workers(self):
+        expected = pa.Table.from_batches(CocoSegmentationDataset(self.coco_path).to_batches())
+        dataset = CocoSegmentationDataset(self.coco_path, mask_workers=2)
+        table = pa.Table.from_batches(dataset.to_batches(batch_size=1))
+        self.assertTrue(table.equals(expected))
+
+    def test_sink_coco_segmentation_rle(self):
+        sink(self.coco_path, self.lance_path, task="segmentation", format="coco", mask_format="rle")
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.schema.field("mask").type, pa.list_(pa.list_(pa.int32())))
+        self.assertEqual(BaseDataset.get_metadata(self.lance_path).misc["mask_format"], "rle")
+
+        counts = table.column("mask").to_pylist()[0][0]
+        self.assertEqual(sum(counts), 100 * 100)
+        mask = decode_mask(counts, 100, 100, "rle")
+
+        png_masks = CocoSegmentationDataset(self.coco_path).to_batches()
+        png_mask = decode_mask(next(png_masks).column("mask")[0][0].as_py(), 100, 100)
+        np.testing.assert_array_equal(mask > 0, png_mask > 0)
+
+        from pycocotools import mask as mask_utils
+        rle = mask_utils.frPyObjects({"size": [100, 100], "counts": counts}, 100, 100)
+        np.testing.assert_array_equal(mask_utils.decode(rle), mask)
+
+    def test_sink_coco_segmentation_polygon(self):
+        with open(self.coco_path, "r") as f:
+            coco_data = json.load(f)
+        # A second image with a crowd (RLE) annotation and a third without annotations.
+        coco_data["images"] += [
+            {"id": 1, "file_name": os.path.join(self.image_dir, "image0.jpg"), "height": 100, "width": 100},
+            {"id": 2, "file_name": os.path.join(self.image_dir, "image0.jpg"), "height": 100, "width": 100},
+        ]
+        coco_data["annotations"].append(
+            {
+                "id": 1,
+                "image_id": 1,
+                "category_id": 1,
+                "bbox": [0, 0, 10, 10],
+                "segmentation": {"size": [100, 100], "counts": [5, 10, 9985]},
+                "iscrowd": 1,
+            }
+        )
+        with open(self.coco_path, "w") as f:
+            json.dump(coco_data, f)
+
+        sink(self.coco_path, self.lance_path, task="segmentation", format="coco", mask_format="polygon")
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.schema.field("mask").type, MASK_TYPES["polygon"])
+
+        masks = table.column("mask").to_pylist()
+        self.assertEqual(len(masks[0]), 1)
+        self.assertEqual(masks[0][0]["polygons"], [[10.0, 20.0, 40.0, 20.0, 40.0, 60.0, 10.0, 60.0]])
+        self.assertIsNone(masks[0][0]["rle"])
+        self.assertEqual(masks[1][0]["polygons"], [])
+        self.assertEqual(masks[2], [])
+
+        png_masks = next(CocoSegmentationDataset(self.coco_path).to_batches()).column("mask")
+        for row in range(2):
+            expected = decode_mask(png_masks[row][0].as_py(), 100, 100)
+            mask = decode_mask(masks[row][0], 100, 100, "polygon")
+            np.testing.assert_array_equal(mask > 0, expected > 0)
+
 
 if __name__ == "__main__":
     unittest.main()
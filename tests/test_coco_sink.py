@@ -1,12 +1,18 @@
 import json
 import os
+import shutil
 import unittest
+from unittest import mock
 
 import lance
 import pandas as pd
 import pyarrow as pa
 
 from atlas.data_sinks import sink
+from atlas.tasks.data_model.base import BaseDataset
+from atlas.tasks.object_detection.coco import CocoDataset
+from atlas.utils.coco import CocoIndex, stream_json_arrays
+from atlas.utils.image import is_blob_field, take_images
 
 
 class CocoSinkTest(unittest.TestCase):
@@ -68,6 +74,179 @@ class CocoSinkTest(unittest.TestCase):
         )
         self.assertEqual(table.column("label").to_pylist(), [[1], [2], [1]])
 
+    def test_sink_coco_io_workers(self):
+        images_data = []
+        for i in range(3):
+            with open(os.path.join(self.image_dir, f"image{i}.jpg"), "rb") as f:
+                images_data.append(f.read())
+
+        for io_workers in [0, 2]:
+            dataset = CocoDataset(self.coco_path, io_workers=io_workers)
+            batches = list(dataset.to_batches(batch_size=2))
+            self.assertEqual([batch.num_rows for batch in batches], [2, 1])
+            table = pa.Table.from_batches(batches)
+            self.assertEqual(table.column("image").to_pylist(), images_data)
+            self.assertEqual(table.column("label").to_pylist(), [[1], [2], [1]])
+
+        sink(self.coco_path, self.lance_path, task="object_detection", format="coco", io_workers=2)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(dataset.to_table().column("image").to_pylist(), images_data)
+
+    def test_sink_coco_num_workers(self):
+        expected = pa.Table.from_batches(CocoDataset(self.coco_path).to_batches())
+        sink(self.coco_path, self.lance_path, task="object_detection", format="coco", num_workers=2)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(len(dataset.get_fragments()), 2)
+        self.assertTrue(dataset.to_table().equals(expected))
+        self.assertEqual(
+            BaseDataset.get_metadata(self.lance_path).class_names, {1: "cat", 2: "dog"}
+        )
+
+        sink(self.coco_path, self.lance_path, task="object_detection", format="coco", mode="append", num_workers=2)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(dataset.count_rows(), 6)
+
+        # Like the serial writer, "create" does not replace an existing dataset.
+        for num_workers in [None, 2]:
+            with self.assertRaises(OSError):
+                sink(self.coco_path, self.lance_path, task="object_detection", format="coco", mode="create", num_workers=num_workers)
+        self.assertEqual(lance.dataset(self.lance_path).count_rows(), 6)
+
+        # Appending to a missing dataset creates it, with its metadata.
+        shutil.rmtree(self.lance_path)
+        sink(self.coco_path, self.lance_path, task="object_detection", format="coco", mode="append", num_workers=2)
+        self.assertTrue(lance.dataset(self.lance_path).to_table().equals(expected))
+        self.assertEqual(
+            BaseDataset.get_metadata(self.lance_path).class_names, {1: "cat", 2: "dog"}
+        )
+
+    def test_sink_coco_reads_source_once(self):
+        from_file = CocoIndex.from_file
+        with mock.patch.object(CocoIndex, "from_file", side_effect=from_file) as patched:
+            sink(self.coco_path, self.lance_path, task="object_detection", format="coco", batch_bytes=1)
+        self.assertEqual(patched.call_count, 1)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(dataset.to_table().column("label").to_pylist(), [[1], [2], [1]])
+
+    def test_sink_coco_blob_images(self):
+        images_data = []
+        for i in range(3):
+            with open(os.path.join(self.image_dir, f"image{i}.jpg"), "rb") as f:
+                images_data.append(f.read())
+
+        for num_workers in [None, 2]:
+            sink(self.coco_path, self.lance_path, task="object_detection", format="coco", blob_images=True, num_workers=num_workers)
+            dataset = lance.dataset(self.lance_path)
+            self.assertTrue(is_blob_field(dataset.schema.field("image")))
+            self.assertEqual(take_images(dataset, "image", [0, 1, 2]), images_data)
+            self.assertEqual(dataset.to_table(columns=["label"]).column("label").to_pylist(), [[1], [2], [1]])
+
+    def test_sink_coco_append_binary_images(self):
+        # Datasets written before image columns were unified store them as binary.
+        sink(self.coco_path, self.lance_path, task="object_detection", format="coco")
+        table = lance.dataset(self.lance_path).to_table()
+        table = table.set_column(0, pa.field("image", pa.binary()), table.column("image").cast(pa.binary()))
+        lance.write_dataset(table, self.lance_path, mode="overwrite")
+
+        for num_workers in [None, 2]:
+            sink(self.coco_path, self.lance_path, task="object_detection", format="coco", mode="append", num_workers=num_workers)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(dataset.schema.field("image").type, pa.binary())
+        self.assertEqual(dataset.to_table().column("image").to_pylist(), table.column("image").to_pylist() * 3)
+
+    def test_sink_coco_null_and_float_values(self):
+        with open(self.coco_path, "r") as f:
+            coco_data = json.load(f)
+        coco_data["images"][0].update(height=None, width=480.0)
+        coco_data["images"][1].update(height=360.0)
+        coco_data["annotations"][1]["category_id"] = 2.0
+        with open(self.coco_path, "w") as f:
+            json.dump(coco_data, f)
+
+        for num_workers in [None, 2]:
+            sink(self.coco_path, self.lance_path, task="object_detection", format="coco", mode="overwrite", num_workers=num_workers)
+            table = lance.dataset(self.lance_path).to_table()
+            self.assertEqual(table.column("height").to_pylist(), [None, 360, 0])
+            self.assertEqual(table.column("width").to_pylist(), [480, 0, 0])
+            self.assertEqual(table.column("label").to_pylist(), [[1], [2], [1]])
+
+    def test_coco_index_shards(self):
+        coco_data = {
+            "images": [{"id": i, "file_name": f"{i}.jpg", "height": i, "width": 2 * i} for i in range(5)],
+            "annotations": [
+                {"id": 0, "image_id": 3, "category_id": 1, "keypoints": [1, 2, 2], "segmentation": [[1, 2, 3, 4, 5, 6]]},
+                {"id": 1, "image_id": 0, "category_id": 2, "bbox": [1, 2, 3, 4], "segmentation": {"counts": [1, 2], "size": [1, 3]}},
+                {"id": 2, "image_id": 3, "bbox": [5, 6, 7, 8], "segmentation": [[0, 0, 1, 1, 2, 2], [3, 3, 4, 4, 5, 5, 6, 6]]},
+                {"id": 3, "image_id": 4, "category_id": 1, "keypoints": [3, 4, 1, 5, 6, 2]},
+            ],
+            "captions": [{"image_id": 4, "caption": "b"}, {"image_id": 1, "caption": "a"}, {"image_id": 4, "caption": "c"}],
+            "categories": [{"id": 1, "name": "cat"}, {"id": 2, "name": "dog"}],
+        }
+        with open(self.coco_path, "w") as f:
+            json.dump(coco_data, f)
+        index = CocoIndex.from_file(self.coco_path, with_segmentation=True)
+
+        def rows(index):
+            def segmentation(ann):
+                value = index.segmentation(ann)
+                return value if isinstance(value, dict) else [p.tolist() for p in value]
+
+            return [
+                (
+                    int(index.image_ids[k]),
+                    int(index.heights[k]),
+                    index.file_names[k],
+                    index.labels(index.annotations(k)),
+                    index.bboxes(index.annotations(k)),
+                    index.keypoints_of(index.annotations(k)),
+                    [segmentation(ann) for ann in index.annotations(k)],
+                    index.image_captions(k),
+                )
+                for k in range(len(index))
+            ]
+
+        shards = index.shards(3)
+        self.assertEqual([len(shard) for shard in shards], [1, 2, 2])
+        self.assertEqual([len(shard.ann_image_ids) for shard in shards], [1, 0, 3])
+        self.assertEqual(sum((rows(shard) for shard in shards), []), rows(index))
+        self.assertEqual(shards[0].class_names, {1: "cat", 2: "dog"})
+
+    def test_coco_index_string_ids(self):
+        # The annotations come first, and refer to images by string ids.
+        coco_data = {
+            "annotations": [
+                {"id": "x", "image_id": "b", "category_id": 2, "bbox": [1, 2, 3, 4]},
+                {"id": "y", "image_id": "a", "category_id": 1, "bbox": [5, 6, 7, 8]},
+                {"id": "z", "image_id": "b", "category_id": 1, "bbox": [9, 10, 11, 12]},
+            ],
+            "images": [{"id": "a", "file_name": "a.jpg"}, {"id": "b", "file_name": "b.jpg"}, {"id": 1, "file_name": "c.jpg"}],
+            "captions": [{"image_id": "a", "caption": "an image"}],
+            "categories": [{"id": 1, "name": "cat"}, {"id": 2, "name": "dog"}],
+        }
+        with open(self.coco_path, "w") as f:
+            json.dump(coco_data, f)
+        for streaming in [False, True]:
+            index = CocoIndex.from_file(self.coco_path, streaming=streaming)
+            self.assertEqual([index.labels(index.annotations(k)) for k in range(3)], [[1], [2, 1], []])
+            self.assertEqual([index.image_captions(k) for k in range(3)], [["an image"], [], []])
+
+    def test_sink_coco_stream_annotations(self):
+        expected = pa.Table.from_batches(CocoDataset(self.coco_path).to_batches())
+        dataset = CocoDataset(self.coco_path, stream_annotations=True)
+        table = pa.Table.from_batches(dataset.to_batches())
+        self.assertTrue(table.equals(expected))
+        self.assertEqual(dataset.metadata.class_names, {1: "cat", 2: "dog"})
+
+        # Small chunks force elements to straddle read boundaries.
+        with open(self.coco_path, "r") as f:
+            coco_data = json.load(f)
+        items = list(stream_json_arrays(self.coco_path, ["annotations", "categories"], chunk_size=7))
+        self.assertEqual(
+            items,
+            [("annotations", ann) for ann in coco_data["annotations"]]
+            + [("categories", cat) for cat in coco_data["categories"]],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
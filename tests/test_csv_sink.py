@@ -6,6 +6,7 @@ import pandas as pd
 import pyarrow as pa
 
 from atlas.data_sinks import sink
+from atlas.tasks.tabular.csv import CsvDataset
 
 
 class CsvSinkTest(unittest.TestCase):
@@ -30,6 +31,21 @@ class CsvSinkTest(unittest.TestCase):
         self.assertEqual(table.column("a").to_pylist(), [1, 2, 3])
         self.assertEqual(table.column("b").to_pylist(), ["x", "y", "z"])
 
+    def test_sink_csv_streaming(self):
+        df = pd.DataFrame({"a.x": range(1000), "b": [str(i) for i in range(1000)]})
+        df.to_csv(self.csv_path, index=False)
+
+        dataset = CsvDataset(self.csv_path, block_size=1024)
+        batches = list(dataset.to_batches(batch_size=300))
+        self.assertEqual([batch.num_rows for batch in batches], [300, 300, 300, 100])
+        self.assertEqual(pa.Table.from_batches(batches).column("a.x").to_pylist(), list(range(1000)))
+
+        sink(self.csv_path, self.lance_path, block_size=1024, column_types={"b": pa.string()})
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column_names, ["a_x", "b"])
+        self.assertEqual(table.schema.field("b").type, pa.string())
+        self.assertEqual(table.column("a_x").to_pylist(), list(range(1000)))
+
 
 if __name__ == "__main__":
     unittest.main()
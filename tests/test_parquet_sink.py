@@ -1,4 +1,5 @@
 import os
+import shutil
 import unittest
 
 import lance
@@ -32,6 +33,25 @@ class ParquetSinkTest(unittest.TestCase):
         self.assertEqual(table.column("a").to_pylist(), [1, 2, 3])
         self.assertEqual(table.column("b").to_pylist(), ["x", "y", "z"])
 
+    def test_sink_parquet_directory(self):
+        parquet_dir = "test_parquet_dir"
+        for part in range(3):
+            os.makedirs(os.path.join(parquet_dir, f"part={part}"), exist_ok=True)
+            table = pa.table({"a": [part * 10 + i for i in range(5)], "b": ["x"] * 5})
+            pq.write_table(table, os.path.join(parquet_dir, f"part={part}", "data.parquet"), row_group_size=2)
+        self.addCleanup(shutil.rmtree, parquet_dir)
+
+        sink(parquet_dir, self.lance_path, columns=["a", "part"], filters=[("a", ">=", 3)])
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column_names, ["a", "part"])
+        self.assertEqual(table.column("a").to_pylist(), [3, 4, 10, 11, 12, 13, 14, 20, 21, 22, 23, 24])
+        self.assertEqual(table.column("part").to_pylist(), [0, 0] + [1] * 5 + [2] * 5)
+
+        sink(os.path.join(parquet_dir, "*", "*.parquet"), self.lance_path, format="parquet", task="tabular", num_workers=2)
+        dataset = lance.dataset(self.lance_path)
+        self.assertEqual(len(dataset.get_fragments()), 2)
+        self.assertEqual(dataset.to_table().column("a").to_pylist(), [part * 10 + i for part in range(3) for i in range(5)])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,29 +1,65 @@
 import unittest
-from unittest.mock import patch
 
-from atlas.utils.system import get_dynamic_batch_size
+import pyarrow as pa
+
+from atlas.utils.system import AdaptiveBatcher, batch_ranges, prefetch
 
 
 class SystemTest(unittest.TestCase):
-    @patch("atlas.utils.system.get_available_memory")
-    def test_get_dynamic_batch_size(self, mock_get_available_memory):
-        # 1 GB of available memory
-        mock_get_available_memory.return_value = 1 * 1024 * 1024 * 1024
-
-        # 1 KB row size
-        row_size = 1 * 1024
-        batch_size = get_dynamic_batch_size(row_size)
-        self.assertEqual(batch_size, int(1 * 1024 * 1024 * 1024 * 0.1 / 1024))
-
-        # 1 MB row size
-        row_size = 1 * 1024 * 1024
-        batch_size = get_dynamic_batch_size(row_size)
-        self.assertEqual(batch_size, int(1 * 1024 * 1024 * 1024 * 0.1 / (1024*1024)))
-
-        # 0 row size (should return default)
-        row_size = 0
-        batch_size = get_dynamic_batch_size(row_size)
-        self.assertEqual(batch_size, 1024)
+    def test_adaptive_batcher(self):
+        # Rows grow from 100 bytes to 10 KB halfway through the stream.
+        small = pa.RecordBatch.from_pydict({"data": [b"x" * 100] * 1000})
+        large = pa.RecordBatch.from_pydict({"data": [b"x" * 10_000] * 1000})
+        target_bytes = 64 * 1024
+
+        batcher = AdaptiveBatcher(target_bytes)
+        batches = list(batcher.rebatch([small.slice(0, 10)] * 100 + [large]))
+
+        rows = [row for batch in batches for row in batch.column("data").to_pylist()]
+        self.assertEqual(rows, [b"x" * 100] * 1000 + [b"x" * 10_000] * 1000)
+        # Small batches are passed through and large ones are split.
+        self.assertEqual([batch.num_rows for batch in batches[:100]], [10] * 100)
+        self.assertGreater(len(batches), 101)
+        for batch in batches:
+            self.assertLessEqual(batch.nbytes, target_bytes)
+
+    def test_adaptive_batcher_read_size(self):
+        target_bytes = 64 * 1024
+        batcher = AdaptiveBatcher(target_bytes, batch_size=64)
+
+        def read(row_bytes):
+            # Reads rows in batches of the size the batcher asks for next.
+            for rows in batch_ranges(100_000, batcher):
+                yield pa.RecordBatch.from_pydict({"data": [b"x" * row_bytes(rows.start)] * len(rows)})
+
+        sizes = []
+        for batch in batcher.rebatch(read(lambda start: 100 if start < 50_000 else 10_000)):
+            sizes.append(batch.num_rows)
+            self.assertLessEqual(batch.nbytes, target_bytes)
+        self.assertEqual(sum(sizes), 100_000)
+        # Small rows are read in batches that fill the budget, large rows in
+        # smaller batches once the estimate has caught up.
+        self.assertEqual(sizes[0], 64)
+        self.assertGreater(max(sizes), 400)
+        self.assertLess(batcher.batch_size, 10)
+        self.assertEqual(list(batch_ranges(5, 2)), [range(0, 2), range(2, 4), range(4, 5)])
+
+    def test_prefetch(self):
+        self.assertEqual(list(prefetch(range(100), depth=3)), list(range(100)))
+
+        def failing():
+            yield 1
+            raise RuntimeError("boom")
+
+        items = prefetch(failing())
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(RuntimeError):
+            next(items)
+
+        # Stopping early does not leave the producer blocked.
+        items = prefetch(iter(range(1000)))
+        self.assertEqual(next(items), 0)
+        items.close()
 
 
 if __name__ == "__main__":
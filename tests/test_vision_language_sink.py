@@ -8,6 +8,7 @@ import lance
 import pyarrow as pa
 
 from atlas.data_sinks import sink
+from atlas.utils.image import read_binary_array
 
 
 class VisionLanguageSinkTest(unittest.TestCase):
@@ -51,6 +52,20 @@ class VisionLanguageSinkTest(unittest.TestCase):
                 images_data.append(f.read())
         self.assertEqual(table.column("image").to_pylist(), images_data)
 
+    def test_sink_vision_language_missing_image(self):
+        with open(self.vl_path, "a") as f:
+            f.write(json.dumps({"image": "missing.png", "text": "text3"}) + "\n")
+        sink(self.vl_path, self.lance_path)
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("image").null_count, 1)
+        self.assertIsNone(table.column("image").to_pylist()[2])
+
+        # All files of a batch share one data buffer.
+        images = read_binary_array([self.image_paths[0], None, self.image_paths[1]])
+        sizes = [os.path.getsize(path) for path in self.image_paths]
+        self.assertEqual(images.buffers()[2].size, sum(sizes))
+        self.assertEqual([len(x) if x else None for x in images.to_pylist()], [sizes[0], None, sizes[1]])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,6 @@
 import os
 import unittest
+from unittest import mock
 import yaml
 
 import lance
@@ -76,6 +77,98 @@ class YoloSinkTest(unittest.TestCase):
                     self.assertAlmostEqual(val, [0.5, 0.5, 0.2, 0.2][k], places=6)
         self.assertEqual(table.column("label").to_pylist(), [[0], [1], [2]])
 
+    def test_sink_yolo_size_cache(self):
+        from PIL import Image
+        image_dir = os.path.join(self.yolo_dir, "images", "train2017")
+        Image.new("RGB", (64, 32)).save(os.path.join(image_dir, "image1.jpg"))
+        Image.new("RGB", (20, 40)).save(os.path.join(image_dir, "image3.png"))
+        cache_path = os.path.join(self.yolo_dir, "sizes.json")
+
+        for _ in range(2):
+            sink(self.yolo_dir, self.lance_path, task="object_detection", format="yolo", size_cache=cache_path)
+            table = lance.dataset(self.lance_path).to_table()
+            self.assertEqual(table.column("width").to_pylist(), [100, 64, 100, 20])
+            self.assertEqual(table.column("height").to_pylist(), [100, 32, 100, 40])
+            self.assertTrue(os.path.exists(cache_path))
+
+    def test_sink_yolo_labels(self):
+        from PIL import Image
+        image_dir = os.path.join(self.yolo_dir, "images", "train2017")
+        label_dir = os.path.join(self.yolo_dir, "labels", "train2017")
+        Image.new("RGB", (10, 10)).save(os.path.join(image_dir, "image3.jpg"))  # no label file
+        with open(os.path.join(label_dir, "image1.txt"), "w") as f:
+            f.write("1 0.1 0.2 0.3 0.4\n\n4 0.5 0.6 0.7 0.8\n")
+
+        sink(self.yolo_dir, self.lance_path, task="object_detection", format="yolo")
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("label").to_pylist(), [[0], [1, 4], [2], []])
+        self.assertEqual(len(table.column("bbox").to_pylist()[1]), 2)
+        for expected, val in zip([0.5, 0.6, 0.7, 0.8], table.column("bbox").to_pylist()[1][1]):
+            self.assertAlmostEqual(val, expected, places=6)
+        self.assertEqual(BaseDataset.get_metadata(self.lance_path).class_names, {i: str(i) for i in range(5)})
+
+    def test_sink_yolo_splits(self):
+        from PIL import Image
+        val_image_dir = os.path.join(self.yolo_dir, "images", "val", "nested")
+        val_label_dir = os.path.join(self.yolo_dir, "labels", "val", "nested")
+        os.makedirs(val_image_dir, exist_ok=True)
+        os.makedirs(val_label_dir, exist_ok=True)
+        Image.new("RGB", (50, 50)).save(os.path.join(val_image_dir, "val0.png"))
+        with open(os.path.join(val_label_dir, "val0.txt"), "w") as f:
+            f.write("1 0.5 0.5 0.1 0.1\n")
+        test_image_dir = os.path.join(self.yolo_dir, "images", "test")
+        os.makedirs(test_image_dir, exist_ok=True)
+        Image.new("RGB", (80, 80)).save(os.path.join(test_image_dir, "test0.jpg"))
+        with open(os.path.join(self.yolo_dir, "test.txt"), "w") as f:
+            f.write("./images/test/test0.jpg\n")
+        with open(os.path.join(self.yolo_dir, "data.yaml"), "w") as f:
+            yaml.dump(
+                {
+                    "path": self.yolo_dir,
+                    "train": "images/train2017",
+                    "val": ["images/val"],
+                    "test": "test.txt",
+                    "names": {0: "a", 1: "b", 2: "c"},
+                },
+                f,
+            )
+
+        sink(os.path.join(self.yolo_dir, "data.yaml"), self.lance_path, io_workers=2)
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("split").to_pylist(), ["train"] * 3 + ["val", "test"])
+        self.assertEqual(table.column("label").to_pylist(), [[0], [1], [2], [1], []])
+        self.assertEqual(table.column("width").to_pylist(), [100, 100, 100, 50, 80])
+        self.assertEqual(BaseDataset.get_metadata(self.lance_path).class_names, {0: "a", 1: "b", 2: "c"})
+
+        sink(self.yolo_dir, self.lance_path, task="object_detection", format="yolo", splits=["val"])
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("file_name").to_pylist(), ["val0.png"])
+
+    def test_sink_yolo_overlapping_splits(self):
+        # Without a `path`, the splits are relative to the directory of data.yaml.
+        with open(os.path.join(self.yolo_dir, "data.yaml"), "w") as f:
+            yaml.dump({"train": "images/train2017", "val": "images/train2017", "names": ["a", "b", "c"]}, f)
+
+        sink(os.path.join(self.yolo_dir, "data.yaml"), self.lance_path)
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("split").to_pylist(), ["train"] * 3)
+        self.assertEqual(table.column("file_name").to_pylist(), [f"image{i}.jpg" for i in range(3)])
+
+    def test_sink_yolo_roboflow_layout(self):
+        # Roboflow exports list the splits relative to the parent directory.
+        import shutil
+        for kind in ("images", "labels"):
+            shutil.move(os.path.join(self.yolo_dir, kind, "train2017"), os.path.join(self.yolo_dir, "train", kind))
+        with open(os.path.join(self.yolo_dir, "data.yaml"), "w") as f:
+            yaml.dump({"train": "../train/images", "names": ["a", "b", "c"]}, f)
+
+        # With io_workers=0, no thread pool is started.
+        with mock.patch("atlas.tasks.object_detection.yolo.ThreadPoolExecutor", side_effect=AssertionError):
+            sink(os.path.join(self.yolo_dir, "data.yaml"), self.lance_path, io_workers=0)
+        table = lance.dataset(self.lance_path).to_table()
+        self.assertEqual(table.column("file_name").to_pylist(), [f"image{i}.jpg" for i in range(3)])
+        self.assertEqual(table.column("label").to_pylist(), [[0], [1], [2]])
+
 
 if __name__ == "__main__":
     unittest.main()